@@ -1,18 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file, send_from_directory, jsonify
+from flask import Flask, Response, g, render_template, request, redirect, url_for, session, send_from_directory, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import MetaData, event, func, select, update, insert, delete, inspect, literal_column, text, tuple_
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql import sqltypes
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date, timedelta
-import io, csv, hashlib, math
+from decimal import Decimal, ROUND_HALF_UP
+import io, os, csv, hashlib, logging, sys, tempfile, time
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from contextlib import contextmanager
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 from flask_apscheduler import APScheduler
+import categorize
+import columnar
+import forecast
+import search
+from cache import ResponseCache
+from functools import wraps
+from db_config import configure_database, date_bucket, month_start
+from metrics import RequestMetrics
+from jobs import JobRegistry
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///budget.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app)
 app.secret_key = 'supersecretkey'  # Change this for production!
 
 db = SQLAlchemy(app)
+request_metrics = RequestMetrics(app)
+app.logger.setLevel(app.config.get('LOG_LEVEL', logging.INFO))
 
 app.jinja_env.globals.update(date=date)
 
@@ -23,14 +43,18 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(80), nullable=False)  # plain-text (not secure!)
-    accounts = db.relationship('Account', backref='user', lazy=True)
+    accounts = db.relationship('Account', backref='user', lazy=True, order_by='Account.id')
 
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     type = db.Column(db.String(20), nullable=False)
-    initial_balance = db.Column(db.Float, default=0.0)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Money columns hold integer cents; see to_cents()/from_cents().
+    initial_balance = db.Column(db.BigInteger, default=0)
+    current_balance = db.Column(db.BigInteger, default=0)  # balance after the latest transaction
+    # Bumped by every write to the account's transactions or balances; feeds response ETags.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     transactions = db.relationship(
         'Transaction',
         backref='account',
@@ -42,59 +66,597 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     description = db.Column(db.String(120))
-    amount = db.Column(db.Float, nullable=False)
-    balance = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.BigInteger, nullable=False)  # cents
+    balance = db.Column(db.BigInteger, nullable=False)  # cents
     category = db.Column(db.String(80), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     is_recurring = db.Column(db.Boolean, default=False)
     recurring_date = db.Column(db.Date, nullable=True)
     frequency = db.Column(db.String(20), nullable=True)
+    # Hash of account, date, amount, normalized description and occurrence number; see fingerprint_rows().
+    fingerprint = db.Column(db.String(32), nullable=True)
+
+    __table_args__ = (
+        # Range scans and (date, id) ordering for a single account.
+        db.Index('ix_transaction_account_date_id', 'account_id', 'date', 'id'),
+        # Covers the per-category monthly sums without touching the table.
+        db.Index('ix_transaction_account_date_category_amount', 'account_id', 'date', 'category', 'amount'),
+        # Re-imported rows are found (and rejected) by fingerprint.
+        db.Index('ix_transaction_fingerprint', 'fingerprint', unique=True),
+        # Only recurring templates are scanned by the scheduler.
+        db.Index('ix_transaction_recurring_due', 'recurring_date',
+                 sqlite_where=is_recurring == True,
+                 postgresql_where=is_recurring == True),
+        # PostgreSQL only: rebuild_monthly_totals groups by this month expression.
+        db.Index('ix_transaction_account_month', account_id, month_start(date))
+          .ddl_if(dialect='postgresql'),
+        # PostgreSQL only: full-text search; SQLite uses the FTS5 table from search.py.
+        db.Index('ix_transaction_search',
+                 search.pg_document(description, category),
+                 postgresql_using='gin')
+          .ddl_if(dialect='postgresql'),
+    )
+
+@event.listens_for(Transaction.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        search.create_sqlite_index(connection)
+
+class CategoryRule(db.Model):
+    # Fills in blank categories on import and add_transaction; see categorize.py.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category = db.Column(db.String(80), nullable=False)
+    match_type = db.Column(db.String(20), nullable=False, default=categorize.SUBSTRING)
+    pattern = db.Column(db.String(120), nullable=True)  # matched against the description
+    min_amount = db.Column(db.BigInteger, nullable=True)  # cents, signed like Transaction.amount
+    max_amount = db.Column(db.BigInteger, nullable=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
+    priority = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # lowest first
+
+class MonthlyCategoryTotal(db.Model):
+    # Incrementally maintained sum/count of Transaction.amount per account, month and category.
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    year_month = db.Column(db.Integer, primary_key=True)  # e.g. 202504 for April 2025
+    category = db.Column(db.String(80), primary_key=True)
+    total = db.Column(db.BigInteger, nullable=False, default=0)  # cents
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# --------------------------
+# Money
+# --------------------------
+def to_cents(value):
+    """Parse a user-supplied amount ("12.34", 12.34) into integer cents, rounding half away from zero."""
+    return int(Decimal(str(value).strip()).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+def series_to_cents(values):
+    """to_cents() for a Series of float units, vectorized."""
+    # Rounding the scaled value to 6 places first drops binary noise (1.005 * 100 is 100.49999999999999).
+    scaled = (values.abs() * 100).round(6)
+    cents = ((scaled + 0.5) // 1).astype('int64')
+    return cents.where(values >= 0, -cents)
+
+def from_cents(cents):
+    """Float units for JSON responses; None stays None."""
+    return None if cents is None else cents / 100
+
+def format_cents(cents):
+    """Exact "-1234.56" text for integer cents, for templates, HTML fragments and CSV."""
+    cents = cents or 0
+    return f"{'-' if cents < 0 else ''}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+app.jinja_env.filters['money'] = format_cents
+
+# --------------------------
+# Account Balances
+# --------------------------
+def bump_data_version(account_ids=None):
+    """Mark accounts as changed (all accounts when account_ids is None) in the current transaction.
+
+    The rollup and balance helpers below call this, so every path that writes
+    transactions or balances moves the version that ETags are derived from.
+    """
+    stmt = update(Account).values(data_version=Account.data_version + 1)
+    if account_ids is not None:
+        stmt = stmt.where(Account.id.in_(list(account_ids)))
+    db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+def refresh_current_balances(account_ids):
+    """Reset current_balance from each account's latest transaction (or its initial balance)."""
+    if not account_ids:
+        return
+    bump_data_version(account_ids)
+    latest_balance = (db.session.query(Transaction.balance)
+                      .filter(Transaction.account_id == Account.id)
+                      .order_by(Transaction.date.desc(), Transaction.id.desc())
+                      .limit(1)
+                      .scalar_subquery())
+    db.session.execute(
+        update(Account)
+        .where(Account.id.in_(list(account_ids)))
+        .values(current_balance=func.coalesce(latest_balance, Account.initial_balance))
+    )
+
+def add_to_current_balance(account_id, delta):
+    """Add delta to an account's current_balance in SQL and return the balance before the change.
+
+    The UPDATE takes the row's write lock before the balance is read, so rows
+    chained from the returned opening balance stay consistent with writes that
+    other requests or import jobs make to the same account.
+    """
+    new_balance = db.session.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(current_balance=Account.current_balance + delta)
+        .returning(Account.current_balance),
+        execution_options={'synchronize_session': False}
+    ).scalar_one()
+    return new_balance - delta
+
+def balance_sign(account):
+    """Credit balances track what is owed, so amounts move them the opposite way."""
+    return -1 if account.type.lower() == "credit" else 1
+
+def latest_transaction_dates(account_ids):
+    """Map account id -> date of its latest transaction, in one grouped query."""
+    if not account_ids:
+        return {}
+    return dict(db.session.query(Transaction.account_id, func.max(Transaction.date))
+                          .filter(Transaction.account_id.in_(list(account_ids)))
+                          .group_by(Transaction.account_id)
+                          .all())
+
+def rebalance_account(account, start=None):
+    """Recompute running balances for account from the (date, id) key start onward.
+
+    With start=None every row is recomputed from the initial balance. Rows before
+    start are trusted, and the last of them supplies the opening balance. The
+    recomputation is a single UPDATE driven by a window-function running sum.
+    current_balance is refreshed afterwards.
+    """
+    in_range = [Transaction.account_id == account.id]
+    opening = None
+    if start is not None:
+        opening = (db.session.query(Transaction.balance)
+                   .filter(Transaction.account_id == account.id,
+                           tuple_(Transaction.date, Transaction.id) < tuple_(*start))
+                   .order_by(Transaction.date.desc(), Transaction.id.desc())
+                   .limit(1)
+                   .scalar())
+        in_range.append(tuple_(Transaction.date, Transaction.id) >= tuple_(*start))
+    if opening is None:
+        opening = account.initial_balance or 0
+    running = (select(
+                   Transaction.id,
+                   (opening + func.sum(Transaction.amount * balance_sign(account))
+                    .over(order_by=(Transaction.date, Transaction.id))).label('balance'))
+               .where(*in_range)
+               .subquery())
+    db.session.execute(
+        update(Transaction)
+        .where(Transaction.id == running.c.id)
+        .values(balance=running.c.balance),
+        execution_options={'synchronize_session': False}
+    )
+    refresh_current_balances([account.id])
+
+@app.cli.command('rebalance')
+def rebalance_command():
+    """Recompute every account's running balances from its initial balance."""
+    accounts = Account.query.order_by(Account.id).all()
+    for account in accounts:
+        rebalance_account(account)
+        db.session.commit()
+    print(f"Rebalanced {len(accounts)} accounts.")
+
+# --------------------------
+# Monthly Category Totals
+# --------------------------
+def month_key(d):
+    """Return the MonthlyCategoryTotal.year_month value for a date."""
+    return d.year * 100 + d.month
+
+def upsert(model):
+    """INSERT statement supporting ON CONFLICT for the active database."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def apply_to_monthly_totals(txns, sign=1):
+    """Add (sign=1) or remove (sign=-1) (account_id, date, category, amount) tuples from the rollup."""
+    deltas = {}
+    for account_id, txn_date, category, amount in txns:
+        key = (int(account_id), month_key(txn_date), category)
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+    if not deltas:
+        return
+    bump_data_version({key[0] for key in deltas})
+    stmt = upsert(MonthlyCategoryTotal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['account_id', 'year_month', 'category'],
+        set_={'total': MonthlyCategoryTotal.total + stmt.excluded.total,
+              'count': MonthlyCategoryTotal.count + stmt.excluded.count}
+    )
+    rows = [{'account_id': account_id, 'year_month': year_month, 'category': category,
+             'total': total, 'count': count}
+            for (account_id, year_month, category), (total, count) in deltas.items()]
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        db.session.execute(stmt, rows[start:start + IMPORT_CHUNK_SIZE])
+    if sign < 0:
+        db.session.execute(
+            delete(MonthlyCategoryTotal)
+            .where(MonthlyCategoryTotal.account_id.in_({key[0] for key in deltas}),
+                   MonthlyCategoryTotal.count <= 0)
+        )
+
+def rebuild_monthly_totals():
+    """Recompute the whole rollup from the transaction table."""
+    db.session.execute(delete(MonthlyCategoryTotal))
+    bump_data_version()
+    db.session.execute(
+        insert(MonthlyCategoryTotal).from_select(
+            ['account_id', 'year_month', 'category', 'total', 'count'],
+            monthly_totals_query(db.session.get_bind().dialect.name)
+        )
+    )
+
+def monthly_totals_query(dialect_name):
+    """(account_id, year_month, category, total, count) per account, month and category."""
+    year_month = date_bucket(Transaction.date, 'month')
+    # On PostgreSQL, group by the ix_transaction_account_month expression; year_month is
+    # computed from that same expression, so it stays valid in the select list.
+    month = month_start(Transaction.date) if dialect_name == 'postgresql' else year_month
+    return (select(Transaction.account_id, year_month, Transaction.category,
+                   func.sum(Transaction.amount), func.count(Transaction.id))
+            .group_by(Transaction.account_id, month, Transaction.category))
+
+# --------------------------
+# Bulk Inserts
+# --------------------------
+IMPORT_CHUNK_SIZE = 1000
+
+def accounts_by_name(user_id):
+    """Map each of the user's account names to its Account (first created wins on duplicates)."""
+    accounts = {}
+    for account in Account.query.filter_by(user_id=user_id).order_by(Account.id):
+        accounts.setdefault(account.name, account)
+    return accounts
+
+def fingerprint_key(account_id, txn_date, amount, description):
+    """Identity of a transaction for duplicate detection; case and spacing of the description are ignored."""
+    return f"{int(account_id)}|{txn_date.isoformat()}|{int(amount)}|{' '.join((description or '').casefold().split())}"
+
+def fingerprint(key, occurrence):
+    return hashlib.blake2b(f"{key}|{occurrence}".encode(), digest_size=16).hexdigest()
+
+def fingerprint_rows(rows, occurrences):
+    """Set each transaction dict's fingerprint.
+
+    Identical rows in one file (two same-day coffees) are told apart by their
+    occurrence number; occurrences counts the keys seen so far and is carried
+    between the chunks of a file. Re-importing the file reproduces the same
+    fingerprints, which stored_fingerprints() then finds.
+    """
+    for row in rows:
+        key = fingerprint_key(row['account_id'], row['date'], row['amount'], row['description'])
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        row['fingerprint'] = fingerprint(key, occurrence)
+
+def stored_fingerprints(fingerprints):
+    """The subset of fingerprints already in the database, one query per IMPORT_CHUNK_SIZE."""
+    fingerprints = list(fingerprints)
+    stored = set()
+    for start in range(0, len(fingerprints), IMPORT_CHUNK_SIZE):
+        stored.update(db.session.scalars(
+            select(Transaction.fingerprint)
+            .where(Transaction.fingerprint.in_(fingerprints[start:start + IMPORT_CHUNK_SIZE]))
+        ))
+    return stored
+
+def assign_fingerprints(rows):
+    """Fingerprint rows that are inserted whatever happens (manual, recurring and legacy rows).
+
+    A row whose fingerprint is taken moves to the next free occurrence number,
+    so it still counts as a match for the same line in a later import.
+    """
+    occurrences = {}
+    fingerprint_rows(rows, occurrences)
+    pending = rows
+    while pending:
+        taken = stored_fingerprints(row['fingerprint'] for row in pending)
+        pending = [row for row in pending if row['fingerprint'] in taken]
+        for row in pending:
+            key = fingerprint_key(row['account_id'], row['date'], row['amount'], row['description'])
+            row['fingerprint'] = fingerprint(key, occurrences[key])
+            occurrences[key] += 1
+
+def backfill_fingerprints():
+    """Fingerprint rows stored before the column existed, IMPORT_CHUNK_SIZE at a time."""
+    filled = 0
+    while True:
+        rows = [row._asdict() for row in
+                db.session.query(Transaction.id, Transaction.account_id, Transaction.date,
+                                 Transaction.amount, Transaction.description)
+                          .filter(Transaction.fingerprint.is_(None))
+                          .order_by(Transaction.id)
+                          .limit(IMPORT_CHUNK_SIZE)]
+        if not rows:
+            break
+        assign_fingerprints(rows)
+        db.session.execute(update(Transaction), [{'id': row['id'], 'fingerprint': row['fingerprint']} for row in rows])
+        db.session.commit()
+        filled += len(rows)
+    if filled:
+        app.logger.info("Fingerprinted %d existing transactions", filled)
+
+def bulk_insert_transactions(rows):
+    """Insert transaction dicts as one executemany per IMPORT_CHUNK_SIZE rows.
+
+    Rows without a fingerprint are given one by assign_fingerprints().
+    """
+    unfingerprinted = [row for row in rows if not row.get('fingerprint')]
+    if unfingerprinted:
+        assign_fingerprints(unfingerprinted)
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        db.session.execute(insert(Transaction), rows[start:start + IMPORT_CHUNK_SIZE])
+    apply_to_monthly_totals((row['account_id'], row['date'], row['category'], row['amount']) for row in rows)
+
+def peak_rss():
+    """The process's peak resident memory so far in bytes, or None where getrusage() is missing."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+@contextmanager
+def measure_import(job, label):
+    """Record on job, and log, how far the process's peak RSS rose during the wrapped import.
+
+    Reading the high-water mark is cheap and does not slow other threads. The
+    rise is 0 when the import stayed below an earlier peak, and imports running
+    at the same time share it.
+    """
+    peak_before = peak_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if peak_before is None:
+            app.logger.info("%s: %d rows in %.2fs", label, job.rows_inserted, elapsed)
+        else:
+            job.peak_rss_growth = peak_rss() - peak_before
+            app.logger.info("%s: %d rows in %.2fs, peak RSS rose %.1f MB",
+                            label, job.rows_inserted, elapsed, job.peak_rss_growth / 1e6)
+
+FRACTIONAL_TYPES = (sqltypes.Float, sqltypes.Numeric)  # Float is not a Numeric subclass in every release
+MONEY_COLUMNS = {
+    Account: ('initial_balance', 'current_balance'),
+    Transaction: ('amount', 'balance'),
+    MonthlyCategoryTotal: ('total',),
+}
+
+def migrate_money_to_cents():
+    """Convert money columns still stored as floating-point units to integer cents.
+
+    PostgreSQL alters the column types in place. SQLite cannot change a
+    column's type, so the table is rebuilt: create a copy with the current
+    definition, fill it with rounded cents, drop the original, rename.
+    Values round half away from zero, as in to_cents(). Running balances are
+    then recomputed, since rounding each stored balance on its own can leave
+    a chain a cent off its rounded amounts.
+    """
+    inspector = inspect(db.engine)
+    converted = False
+    for model, names in MONEY_COLUMNS.items():
+        table = model.__table__
+        reflected = {c['name']: c['type'] for c in inspector.get_columns(table.name)}
+        stale = [name for name in names if isinstance(reflected.get(name), FRACTIONAL_TYPES)]
+        if not stale:
+            continue
+        converted = True
+        with db.engine.begin() as conn:
+            quote = conn.dialect.identifier_preparer.quote
+            if conn.dialect.name != 'sqlite':
+                for name in stale:
+                    conn.execute(text(f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(name)} "
+                                      f"TYPE BIGINT USING ROUND({quote(name)}::numeric * 100)::bigint"))
+                continue
+            # Copy every table so foreign keys resolve when the new table's DDL is compiled.
+            metadata = MetaData()
+            for other in db.metadata.sorted_tables:
+                other.to_metadata(metadata)
+            rebuilt = table.to_metadata(metadata, name=table.name + '_cents')
+            conn.execute(CreateTable(rebuilt))
+            copied = [column.name for column in table.columns if column.name in reflected]
+            # The inner ROUND drops binary noise first, as series_to_cents() does (-1.005 * 100 is -100.49999...).
+            values = [f"CAST(ROUND(ROUND({quote(name)} * 100, 6)) AS INTEGER)" if name in stale else quote(name)
+                      for name in copied]
+            conn.execute(text(f"INSERT INTO {quote(rebuilt.name)} ({', '.join(map(quote, copied))}) "
+                              f"SELECT {', '.join(values)} FROM {quote(table.name)}"))
+            conn.execute(text(f"DROP TABLE {quote(table.name)}"))
+            conn.execute(text(f"ALTER TABLE {quote(rebuilt.name)} RENAME TO {quote(table.name)}"))
+        app.logger.info("Converted %s.%s to integer cents", table.name, ", ".join(stale))
+    if converted:
+        for account in Account.query.order_by(Account.id).all():
+            rebalance_account(account)
+        db.session.commit()
+        app.logger.info("Recomputed running balances after the cents conversion")
+
+def ensure_schema():
+    """Add columns and indexes introduced after a database was first created."""
+    columns = {c['name']: c['type'] for c in inspect(db.engine).get_columns('account')}
+    if 'data_version' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE account ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+    if 'current_balance' not in columns:
+        # Same representation as initial_balance; migrate_money_to_cents() converts both.
+        money_type = 'FLOAT' if isinstance(columns['initial_balance'], FRACTIONAL_TYPES) else 'BIGINT'
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE account ADD COLUMN current_balance {money_type} DEFAULT 0"))
+        refresh_current_balances([account_id for (account_id,) in db.session.query(Account.id)])
+        db.session.commit()
+    migrate_money_to_cents()
+    # After the cents migration: fingerprints hash amounts in cents.
+    if 'fingerprint' not in {c['name'] for c in inspect(db.engine).get_columns('transaction')}:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE "transaction" ADD COLUMN fingerprint VARCHAR(32)'))
+    backfill_fingerprints()
+    migrate_recurring_schedules()
+    # Older databases have no FTS table, and SQLite table rebuilds drop its triggers.
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as conn:
+            if not search.sqlite_index_is_current(conn):
+                search.create_sqlite_index(conn)
+    # The rollup table is new to older databases: fill it from existing transactions.
+    if (not db.session.query(MonthlyCategoryTotal.account_id).first()
+            and db.session.query(Transaction.id).first()):
+        rebuild_monthly_totals()
+        db.session.commit()
+    # db.create_all() skips tables that already exist (and table rebuilds drop indexes),
+    # so indexes are (re)created here.
+    for model in (Account, Transaction):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Bring an existing budget.db up to the current schema."""
+    db.create_all()
+    ensure_schema()
+    with db.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print("Database schema is up to date.")
+
+@app.cli.command('rebuild-monthly-totals')
+def rebuild_monthly_totals_command():
+    """Recompute the monthly category rollup from scratch."""
+    rebuild_monthly_totals()
+    db.session.commit()
+    print("Monthly category totals rebuilt.")
 
 # --------------------------
 # APScheduler Setup
 # --------------------------
 class Config:
     SCHEDULER_API_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    RESPONSE_CACHE_TTL = 300  # seconds
+    IMPORT_JOB_HISTORY = 200  # finished import jobs kept for /jobs/<id>
 
 app.config.from_object(Config())
 scheduler = APScheduler()
 
+def advance_recurring_date(rec_date, frequency):
+    """Next occurrence after rec_date, or None when the frequency does not repeat."""
+    if frequency == 'monthly':
+        return rec_date + relativedelta(months=+1)
+    elif frequency == 'yearly':
+        return rec_date + relativedelta(years=+1)
+    return None
+
+def migrate_recurring_schedules():
+    """Convert recurring rows written before recurring_date meant "next due date".
+
+    Templates used to keep their own date until first posted, and every posted
+    "(Recurring)" copy carried a schedule too. Such templates are moved on one
+    period (the template row is that occurrence) and copies lose their schedule.
+    """
+    moved = [{'id': row.id, 'recurring_date': advance_recurring_date(row.date, row.frequency)}
+             for row in db.session.query(Transaction.id, Transaction.date, Transaction.frequency)
+                                  .filter(Transaction.is_recurring == True,
+                                          Transaction.recurring_date == Transaction.date,
+                                          ~Transaction.description.like('% (Recurring)'))]
+    if moved:
+        db.session.execute(update(Transaction), moved)
+    copies = db.session.execute(
+        update(Transaction)
+        .where(Transaction.is_recurring == True,
+               Transaction.recurring_date.isnot(None),
+               Transaction.description.like('% (Recurring)'))
+        .values(recurring_date=None),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    if moved or copies:
+        app.logger.info("Rescheduled %d recurring templates and cleared %d posted copies", len(moved), copies)
+
 def check_recurring_transactions():
+    """Post every occurrence of every recurring transaction that fell due up to today.
+
+    Templates are grouped by account; each account's missed occurrences are
+    posted in date order with chained balances and committed together.
+    Returns a summary dict with counts and elapsed seconds.
+    """
     with app.app_context():
+        started = time.perf_counter()
         today = date.today()
-        print(f"[APScheduler] Checking recurring transactions for {today}")
-        recurring_txns = Transaction.query.filter(
+        app.logger.info("[APScheduler] Checking recurring transactions for %s", today)
+        # Plain rows: the per-account commits below would otherwise expire loaded objects
+        # and cost a refresh SELECT for each of them.
+        templates = db.session.query(
+            Transaction.id, Transaction.account_id, Transaction.description, Transaction.amount,
+            Transaction.category, Transaction.frequency, Transaction.recurring_date
+        ).filter(
             Transaction.is_recurring == True,
             Transaction.recurring_date <= today
-        ).all()
-        for txn in recurring_txns:
-            last_txn = Transaction.query.filter_by(account_id=txn.account_id)\
-                                        .order_by(Transaction.date.desc(), Transaction.id.desc()).first()
-            if last_txn:
-                new_balance = last_txn.balance + txn.amount
-            else:
-                account = Account.query.get(txn.account_id)
-                new_balance = account.initial_balance + txn.amount
-            if txn.frequency == 'monthly':
-                next_date = txn.recurring_date + relativedelta(months=+1)
-            elif txn.frequency == 'yearly':
-                next_date = txn.recurring_date + relativedelta(years=+1)
-            else:
-                next_date = None
-            new_txn = Transaction(
-                date=today,
-                description=txn.description + " (Recurring)",
-                amount=txn.amount,
-                balance=new_balance,
-                category=txn.category,
-                account_id=txn.account_id,
-                is_recurring=True,
-                recurring_date=next_date,
-                frequency=txn.frequency
-            )
-            db.session.add(new_txn)
-            txn.recurring_date = next_date
-        db.session.commit()
+        ).order_by(Transaction.account_id, Transaction.id).all()
+        templates_by_account = {}
+        for template in templates:
+            templates_by_account.setdefault(template.account_id, []).append(template)
+        accounts = {account.id: account for account in
+                    db.session.query(Account.id, Account.type, Account.user_id, Account.initial_balance)
+                              .filter(Account.id.in_(list(templates_by_account)))}
+        latest_dates = latest_transaction_dates(templates_by_account)
+
+        posted = 0
+        for account_id, account_templates in templates_by_account.items():
+            account = accounts[account_id]
+            sign = balance_sign(account)
+            # Catch up on every period missed since the template was last posted.
+            occurrences = []
+            next_dates = []
+            for template in account_templates:
+                due = template.recurring_date
+                while due is not None and due <= today:
+                    occurrences.append((due, template.id, template))
+                    due = advance_recurring_date(due, template.frequency)
+                next_dates.append({'id': template.id, 'recurring_date': due})
+            occurrences.sort(key=lambda occurrence: occurrence[:2])
+            db.session.execute(update(Transaction), next_dates)
+
+            balance = add_to_current_balance(
+                account_id, sum(sign * template.amount for _, _, template in occurrences))
+            rows = []
+            for due, _, template in occurrences:
+                balance += sign * template.amount
+                # Posted copies carry no schedule of their own; only the template recurs.
+                rows.append({
+                    'date': due,
+                    'description': template.description + " (Recurring)",
+                    'amount': template.amount,
+                    'balance': balance,
+                    'category': template.category,
+                    'account_id': account_id,
+                    'is_recurring': True,
+                    'recurring_date': None,
+                    'frequency': template.frequency,
+                })
+            bulk_insert_transactions(rows)
+            # Occurrences dated before existing rows shift those rows' balances.
+            if occurrences and account_id in latest_dates and occurrences[0][0] < latest_dates[account_id]:
+                rebalance_account(account, (occurrences[0][0], 0))
+            db.session.commit()
+            invalidate_user_cache(account.user_id, [account_id])
+            posted += len(rows)
+
+        elapsed = time.perf_counter() - started
+        app.logger.info("[APScheduler] Posted %d occurrences of %d recurring transactions across %d accounts in %.2fs",
+                        posted, len(templates), len(templates_by_account), elapsed)
+        return {"templates": len(templates), "accounts": len(templates_by_account),
+                "posted": posted, "seconds": elapsed}
 
 scheduler.add_job(
     id='RecurringTransactionJob',
@@ -106,6 +668,92 @@ scheduler.add_job(
 scheduler.init_app(app)
 scheduler.start()
 
+# --------------------------
+# Response Cache and ETags
+# --------------------------
+response_cache = ResponseCache(max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+                               ttl=app.config['RESPONSE_CACHE_TTL'])
+
+def cached_json(per_account):
+    """Cache a view's 200 JSON responses per user, endpoint and query string.
+
+    With per_account=True the entry is only dropped by writes to the requested
+    account_id; otherwise any write to the user's data drops it. Under
+    etag_json the key also holds the response's ETag, so a data_version bump
+    that is not yet followed by invalidate_user_cache() (a write between its
+    commit and the invalidation, or an import job still running) misses the
+    cache instead of serving the old body under the new tag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session:
+                return view(*args, **kwargs)
+            key = (session['user_id'], request.endpoint,
+                   tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))),
+                   g.get('etag'))
+            body = response_cache.get(key)
+            if body is not None:
+                return app.response_class(body, mimetype='application/json')
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'application/json':
+                account_id = request.args.get('account_id', '')
+                depends_on = {int(account_id)} if per_account and account_id.isdigit() else None
+                response_cache.set(key, response.get_data(), depends_on)
+            return response
+        return wrapper
+    return decorator
+
+def etag_json(per_account):
+    """Give a view's JSON an ETag and answer a matching If-None-Match with 304 before the view runs.
+
+    The tag covers the user, endpoint, arguments, today's date (for views that
+    default to the current month) and the data_version of the accounts the
+    response reads: the requested or first account with per_account=True,
+    otherwise all of the user's accounts. Checking it costs one query on the
+    account table and no aggregation.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session:
+                return view(*args, **kwargs)
+            versions = (db.session.query(Account.id, Account.data_version)
+                        .filter(Account.user_id == session['user_id'])
+                        .order_by(Account.id)
+                        .all())
+            if per_account:
+                account_id = request.args.get('account_id', '')
+                if account_id:
+                    versions = [v for v in versions if str(v.id) == account_id]
+                    if not versions:
+                        return view(*args, **kwargs)  # not one of the user's accounts: nothing to version
+                else:
+                    versions = versions[:1]  # the views fall back to the first account
+            tag = hashlib.sha1(repr((
+                session['user_id'], request.endpoint, sorted(kwargs.items()),
+                sorted(request.args.items(multi=True)), date.today().isoformat(),
+                [tuple(v) for v in versions],
+            )).encode()).hexdigest()
+            g.etag = tag  # part of cached_json's key
+            if request.if_none_match.contains_weak(tag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            # Browsers keep the body but revalidate on every request.
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+def invalidate_user_cache(user_id, account_ids=None):
+    """Drop cached responses after a committed write to the user's data."""
+    response_cache.invalidate(user_id, account_ids)
+
 # --------------------------
 # Routes
 # --------------------------
@@ -121,6 +769,10 @@ def serve_css(filename):
 def serve_scripts(filename):
     return send_from_directory('templates/scripts', filename)
 
+def current_user_with_accounts():
+    """The logged-in user, with their accounts loaded by the same query."""
+    return db.session.get(User, session['user_id'], options=[joinedload(User.accounts)])
+
 # --- User Registration ---
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -160,7 +812,7 @@ def logout():
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
+    user = current_user_with_accounts()
     
     # --- Determine Date Filter ---
     start_date_str = request.args.get('start_date')
@@ -172,7 +824,7 @@ def dashboard():
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
         except Exception as e:
-            print("Date parsing error:", e)
+            app.logger.warning("Date parsing error: %s", e)
             start_date = date.today().replace(day=1)
             end_date = (start_date + relativedelta(months=+1)) - timedelta(days=1)
     elif month_str:
@@ -181,7 +833,7 @@ def dashboard():
             start_date = datetime.strptime(month_str, '%Y-%m').date().replace(day=1)
             end_date = (start_date + relativedelta(months=+1)) - timedelta(days=1)
         except Exception as e:
-            print("Month parsing error:", e)
+            app.logger.warning("Month parsing error: %s", e)
             start_date = date.today().replace(day=1)
             end_date = (start_date + relativedelta(months=+1)) - timedelta(days=1)
     else:
@@ -198,6 +850,7 @@ def dashboard():
         try:
             account_id_int = int(filter_account_id)
             transactions = (Transaction.query.filter_by(account_id=account_id_int)
+                            .options(joinedload(Transaction.account))
                             .filter(Transaction.date >= start_date, Transaction.date <= end_date)
                             .order_by(Transaction.date.desc(), Transaction.id.desc())
                             .all())
@@ -211,17 +864,9 @@ def dashboard():
     for txn in transactions:
         category_totals[txn.category] = category_totals.get(txn.category, 0) + txn.amount
 
-    account_balances = {}
-    for account in user.accounts:
-        last_txn = (Transaction.query.filter_by(account_id=account.id)
-                                     .order_by(Transaction.date.desc(), Transaction.id.desc())
-                                     .first())
-        if last_txn:
-            account_balances[account.name] = last_txn.balance
-        else:
-            account_balances[account.name] = account.initial_balance
+    account_balances = {account.name: account.current_balance for account in user.accounts}
 
-    total_balance = 0.0
+    total_balance = 0
     for account in user.accounts:
         if account.type.lower() == 'bank':
             total_balance += account_balances.get(account.name, 0)
@@ -246,81 +891,112 @@ def dashboard():
 
 
 # Dashboard data for less refreshes
-@app.route('/dashboard_data')
-def dashboard_data():
-    if 'user_id' not in session:
-        return jsonify({"error": "Not logged in"}), 401
-    user = db.session.get(User, session['user_id'])
-    account_id = request.args.get('account_id')
-    
-    # Check for date filters
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    month_str = request.args.get('month')
-    
-    transactions_query = None
-    if account_id:
-        transactions_query = Transaction.query.filter_by(account_id=int(account_id))
-    else:
-        # Combine transactions from all accounts if no specific account is given.
-        transactions_query = db.session.query(Transaction).filter(
-            Transaction.account_id.in_([account.id for account in user.accounts])
-        )
-    
-    # Apply date filter if provided
+TRANSACTIONS_PAGE_SIZE = 100
+MAX_TRANSACTIONS_PAGE_SIZE = 500
+
+def dashboard_date_range(args):
+    """Return the (start, end) dates selected by start_date/end_date or month, or (None, None)."""
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
+    month_str = args.get('month')
     if start_date_str and end_date_str:
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            transactions_query = transactions_query.filter(
-                Transaction.date >= start_date,
-                Transaction.date <= end_date
-            )
+            return start_date, end_date
         except Exception as e:
-            print("Date parsing error in dashboard_data:", e)
+            app.logger.warning("Date parsing error in dashboard_data: %s", e)
     elif month_str:
         try:
             start_date = datetime.strptime(month_str, '%Y-%m').date().replace(day=1)
             end_date = (start_date + relativedelta(months=+1)) - timedelta(days=1)
-            transactions_query = transactions_query.filter(
-                Transaction.date >= start_date,
-                Transaction.date <= end_date
-            )
+            return start_date, end_date
         except Exception as e:
-            print("Month parsing error in dashboard_data:", e)
-    
-    transactions = transactions_query.order_by(Transaction.date.desc(), Transaction.id.desc()).all()
-    
-    # Build HTML for the transaction list...
-    transactions_html = ""
-    for txn in transactions:
+            app.logger.warning("Month parsing error in dashboard_data: %s", e)
+    return None, None
+
+def transactions_page(user, args, matching_ids=None):
+    """Fetch one page of the user's transactions, newest first, with account names joined in.
+
+    Pages are keyset-based: the cursor is the "<date>_<id>" of the last row already shown.
+    matching_ids optionally limits the page to a subquery of transaction ids (a search).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed account_id, limit or cursor.
+    """
+    account_ids = [account.id for account in user.accounts]
+    account_id = args.get('account_id')
+    if account_id:
+        # Only the user's own accounts can be listed.
+        account_ids = [int(account_id)] if int(account_id) in account_ids else []
+    limit = int(args.get('limit', TRANSACTIONS_PAGE_SIZE))
+    limit = max(1, min(limit, MAX_TRANSACTIONS_PAGE_SIZE))
+
+    query = (db.session.query(Transaction.id, Transaction.date, Account.name.label('account_name'),
+                              Transaction.description, Transaction.amount, Transaction.balance,
+                              Transaction.category, Transaction.is_recurring, Transaction.recurring_date)
+             .join(Account, Transaction.account_id == Account.id))
+    if matching_ids is None:
+        query = query.filter(Transaction.account_id.in_(account_ids))
+    else:
+        # "+ 0" keeps SQLite from walking the account index and probing every row against
+        # the id list; fetching the matched ids by primary key and sorting them is far cheaper.
+        query = query.filter(Transaction.id.in_(matching_ids), (Transaction.account_id + 0).in_(account_ids))
+    start_date, end_date = dashboard_date_range(args)
+    if start_date and end_date:
+        query = query.filter(Transaction.date >= start_date, Transaction.date <= end_date)
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_date_str, cursor_id_str = cursor.split('_')
+        cursor_date = datetime.strptime(cursor_date_str, '%Y-%m-%d').date()
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < tuple_(cursor_date, int(cursor_id_str)))
+
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].date.isoformat()}_{rows[-1].id}"
+    return rows, next_cursor
+
+def render_transaction_rows(rows):
+    """Build the <tr> markup for the dashboard's transaction table."""
+    parts = []
+    for txn in rows:
         remove_url = url_for('remove_transaction', transaction_id=txn.id)
-        transactions_html += (
+        parts.append(
             "<tr>"
             f"<td><input type='checkbox' name='transaction_ids' value='{txn.id}'></td>"
             f"<td>{txn.date.strftime('%m/%d/%Y')}</td>"
-            f"<td>{txn.account.name}</td>"
+            f"<td>{txn.account_name}</td>"
             f"<td>{txn.description}</td>"
-            f"<td>{txn.amount:.2f}</td>"
-            f"<td>{txn.balance:.2f}</td>"
+            f"<td>{format_cents(txn.amount)}</td>"
+            f"<td>{format_cents(txn.balance)}</td>"
             f"<td>{txn.category}</td>"
             f"<td>{'Yes' if txn.is_recurring else 'No'}</td>"
             f"<td>{txn.recurring_date if txn.recurring_date else '-'}</td>"
             f"<td><a href='{remove_url}' class='remove-link'>Remove</a></td>"
             "</tr>"
         )
-    
+    return "".join(parts)
+
+@app.route('/dashboard_data')
+@etag_json(per_account=False)
+@cached_json(per_account=False)
+def dashboard_data():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    user = current_user_with_accounts()
+
+    # Only the first page of transactions; the rest come from /transactions_data.
+    try:
+        transactions, next_cursor = transactions_page(user, request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid account_id, limit or cursor."}), 400
+    transactions_html = render_transaction_rows(transactions)
+
     # Compute balances (same as before)
-    account_balances = {}
-    for account in user.accounts:
-        last_txn = Transaction.query.filter_by(account_id=account.id)\
-                     .order_by(Transaction.date.desc(), Transaction.id.desc()).first()
-        if last_txn:
-            account_balances[account.name] = last_txn.balance
-        else:
-            account_balances[account.name] = account.initial_balance
+    account_balances = {account.name: account.current_balance for account in user.accounts}
     
-    total_balance = 0.0
+    total_balance = 0
     for account in user.accounts:
         if account.type.lower() == 'bank':
             total_balance += account_balances.get(account.name, 0)
@@ -330,14 +1006,68 @@ def dashboard_data():
             total_balance += account_balances.get(account.name, 0)
     
     return jsonify({
-        "account_balances": account_balances,
-        "total_balance": total_balance,
-        "transactions_html": transactions_html
+        "account_balances": {name: from_cents(balance) for name, balance in account_balances.items()},
+        "total_balance": from_cents(total_balance),
+        "transactions_html": transactions_html,
+        "next_cursor": next_cursor
+    })
+
+# Further pages of the dashboard's transaction table
+@app.route('/transactions_data')
+def transactions_data():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    user = current_user_with_accounts()
+    try:
+        transactions, next_cursor = transactions_page(user, request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid account_id, limit or cursor."}), 400
+    return jsonify({
+        "transactions_html": render_transaction_rows(transactions),
+        "next_cursor": next_cursor
     })
 
 
 
 
+# --- Transaction Search ---
+def search_matches(terms):
+    """Subquery of the ids of transactions whose description or category contain all terms."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return (select(literal_column('rowid'))
+                .select_from(text(search.FTS_TABLE))
+                .where(text(f"{search.FTS_TABLE} MATCH :fts_query")
+                       .bindparams(fts_query=search.fts5_query(terms))))
+    # Same expression as ix_transaction_search so PostgreSQL can use the GIN index.
+    document = search.pg_document(Transaction.description, Transaction.category)
+    return select(Transaction.id).where(search.pg_match(document, terms))
+
+@app.route('/search')
+def search_transactions():
+    """Search the user's transactions: q plus the account_id, date range, limit and cursor of /transactions_data."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    terms = search.parse_query(request.args.get('q', ''))
+    if not terms:
+        return jsonify({"error": "q must contain at least one word."}), 400
+    user = current_user_with_accounts()
+    try:
+        rows, next_cursor = transactions_page(user, request.args, matching_ids=search_matches(terms))
+    except ValueError:
+        return jsonify({"error": "Invalid account_id, limit or cursor."}), 400
+    return jsonify({
+        "transactions": [{
+            "id": row.id,
+            "date": row.date.isoformat(),
+            "account": row.account_name,
+            "description": row.description,
+            "amount": from_cents(row.amount),
+            "balance": from_cents(row.balance),
+            "category": row.category,
+        } for row in rows],
+        "next_cursor": next_cursor
+    })
+
 # --- Add a New Transaction ---
 @app.route('/add_transaction', methods=['POST'])
 def add_transaction():
@@ -346,39 +1076,57 @@ def add_transaction():
     account_id = request.form['account_id']
     date_str = request.form['date']
     description = request.form['description']
-    amount = float(request.form['amount'])
-    category = request.form['category']
+    amount = to_cents(request.form['amount'])
+    category = request.form.get('category', '').strip()
     txn_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     account = Account.query.get(account_id)
-    effective_amount = -amount if account.type.lower() == "credit" else amount
-    last_txn = Transaction.query.filter_by(account_id=account_id)\
-                                  .order_by(Transaction.date.desc(), Transaction.id.desc()).first()
-    new_balance = last_txn.balance + effective_amount if last_txn else account.initial_balance + effective_amount
+    if not category:
+        category = rule_matcher(session['user_id']).categorize(description, amount, account.id) or 'Miscellaneous'
+    effective_amount = balance_sign(account) * amount
+    new_balance = add_to_current_balance(account.id, effective_amount) + effective_amount
     is_recurring_input = request.form.get("is_recurring", "no")
     is_recurring = True if is_recurring_input.lower() == "yes" else False
-    recurring_date = txn_date if is_recurring else None
     frequency = request.form.get("frequency", "").strip() if is_recurring else None
-    new_txn = Transaction(
+    # This row is the first occurrence; recurring_date is when the next one falls due.
+    recurring_date = advance_recurring_date(txn_date, frequency) if is_recurring else None
+    values = dict(
         date=txn_date,
         description=description,
         amount=amount,
         balance=new_balance,
         category=category,
-        account_id=account_id,
+        account_id=account.id,
         is_recurring=is_recurring,
         recurring_date=recurring_date,
         frequency=frequency
     )
+    # A later import of the same statement line is then recognized as a duplicate.
+    assign_fingerprints([values])
+    new_txn = Transaction(**values)
     db.session.add(new_txn)
+    apply_to_monthly_totals([(account.id, txn_date, category, amount)])
+    db.session.flush()
+    # A back-dated transaction changes the balance of every later row.
+    if (Transaction.query.filter(Transaction.account_id == account.id, Transaction.date > txn_date)
+                         .with_entities(Transaction.id).first()):
+        rebalance_account(account, (txn_date, new_txn.id))
     db.session.commit()
+    invalidate_user_cache(session['user_id'], [account.id])
     return redirect(url_for('dashboard', filter_account_id=account_id))
 
-# --- Export Transactions as CSV ---
+# --- Export Transactions as CSV or Parquet ---
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
 @app.route('/export')
 def export():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_MIMETYPES:
+        return f"Unknown export format; use one of: {', '.join(EXPORT_MIMETYPES)}.", 400
+    if export_format == 'parquet' and not columnar.AVAILABLE:
+        return "Parquet export requires the pyarrow package.", 400
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
     start_date = end_date = None
@@ -387,37 +1135,49 @@ def export():
             start_date = datetime.strptime(start_date_str, '%m-%d-%Y').date()
             end_date = datetime.strptime(end_date_str, '%m-%d-%Y').date()
         except Exception as e:
-            print("Date parsing error:", e)
-    transactions = []
-    for account in user.accounts:
-        query = Transaction.query.filter_by(account_id=account.id)
-        if start_date and end_date:
-            query = query.filter(Transaction.date >= start_date, Transaction.date <= end_date)
-        transactions += query.order_by(Transaction.date.asc(), Transaction.id.asc()).all()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["Date", "Account", "Description", "Amount", "Balance", "Category"])
-    for txn in transactions:
-        cw.writerow([
-            txn.date.strftime('%m-%d-%Y'),
-            txn.account.name,
-            txn.description,
-            txn.amount,
-            txn.balance,
-            txn.category
-        ])
-    output = si.getvalue()
+            app.logger.warning("Date parsing error: %s", e)
+    # One joined query for all of the user's accounts, read in batches from the cursor.
+    query = (db.session.query(Transaction.date, Account.name, Transaction.description,
+                              Transaction.amount, Transaction.balance, Transaction.category)
+             .join(Account, Transaction.account_id == Account.id)
+             .filter(Account.user_id == session['user_id']))
+    if start_date and end_date:
+        query = query.filter(Transaction.date >= start_date, Transaction.date <= end_date)
+    query = query.order_by(Account.id, Transaction.date.asc(), Transaction.id.asc()).yield_per(EXPORT_CHUNK_SIZE)
+
+    def rows():
+        # The body streams after the request's session was removed; the query reopens a
+        # connection on that session, which must be given back here.
+        try:
+            yield from query
+        finally:
+            query.session.close()
+
+    def generate():
+        buffer = io.StringIO()
+        cw = csv.writer(buffer)
+        cw.writerow(["Date", "Account", "Description", "Amount", "Balance", "Category"])
+        for count, (txn_date, account_name, description, amount, balance, category) in enumerate(rows(), 1):
+            cw.writerow([txn_date.strftime('%m-%d-%Y'), account_name, description,
+                         format_cents(amount), format_cents(balance), category])
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
     if start_date and end_date:
         start_str = start_date.strftime('%b') + "_" + str(start_date.day) + "_" + start_date.strftime('%y')
         end_str = end_date.strftime('%b') + "_" + str(end_date.day) + "_" + end_date.strftime('%y')
-        filename = f"{start_str}_{end_str}_transactions.csv"
+        filename = f"{start_str}_{end_str}_transactions.{export_format}"
     else:
-        filename = "transactions.csv"
-    return send_file(
-        io.BytesIO(output.encode('utf-8')),
-        mimetype="text/csv",
-        as_attachment=True,
-        download_name=filename
+        filename = f"transactions.{export_format}"
+    # Parquet keeps typed dates and exact decimal amounts; row groups are streamed as they fill.
+    body = columnar.write_parquet(rows()) if export_format == 'parquet' else generate()
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 # --- Removing Single Transaction ---
@@ -425,26 +1185,63 @@ def export():
 def remove_transaction(transaction_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    txn = Transaction.query.get(transaction_id)
+    txn = db.session.get(Transaction, transaction_id, options=[joinedload(Transaction.account)])
     if txn and txn.account.user_id == session['user_id']:
-        account_id = txn.account.id
+        account = txn.account
+        account_id = account.id
         db.session.delete(txn)
+        apply_to_monthly_totals([(txn.account_id, txn.date, txn.category, txn.amount)], sign=-1)
+        db.session.flush()
+        rebalance_account(account, (txn.date, txn.id))
         db.session.commit()
+        invalidate_user_cache(session['user_id'], [account_id])
         return redirect(url_for('dashboard', filter_account_id=account_id))
     return redirect(url_for('dashboard'))
 
 # --- Removing Multiple Transactions ---
+DELETE_CHUNK_SIZE = 500  # stays well under SQLite's bound-parameter limit
+
+def delete_user_transactions(user_id, txn_ids):
+    """Delete the listed transactions that belong to user_id and return how many were removed.
+
+    Each chunk is one DELETE ... WHERE id IN (...) AND account_id IN (user's accounts)
+    that returns the removed rows, which then drive the rollup and rebalance updates.
+    """
+    owned_accounts = select(Account.id).where(Account.user_id == user_id).scalar_subquery()
+    removed = []
+    for start in range(0, len(txn_ids), DELETE_CHUNK_SIZE):
+        result = db.session.execute(
+            delete(Transaction)
+            .where(Transaction.id.in_(txn_ids[start:start + DELETE_CHUNK_SIZE]),
+                   Transaction.account_id.in_(owned_accounts))
+            .returning(Transaction.id, Transaction.account_id, Transaction.date,
+                       Transaction.category, Transaction.amount),
+            execution_options={'synchronize_session': False}
+        )
+        removed.extend(result.all())
+    if not removed:
+        return 0
+    apply_to_monthly_totals([(row.account_id, row.date, row.category, row.amount) for row in removed], sign=-1)
+    rebalance_from = {}
+    for row in removed:
+        key = (row.date, row.id)
+        if row.account_id not in rebalance_from or key < rebalance_from[row.account_id]:
+            rebalance_from[row.account_id] = key
+    for account in Account.query.filter(Account.id.in_(list(rebalance_from))):
+        rebalance_account(account, rebalance_from[account.id])
+    db.session.commit()
+    invalidate_user_cache(user_id, rebalance_from.keys())
+    return len(removed)
+
 @app.route('/remove_transactions', methods=['POST'])
 def remove_transactions():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    txn_ids = request.form.getlist('transaction_ids')
+    txn_ids = [int(txn_id) for txn_id in request.form.getlist('transaction_ids') if txn_id.isdigit()]
     filter_account_id = request.args.get('filter_account_id')
-    for txn_id in txn_ids:
-        txn = Transaction.query.get(txn_id)
-        if txn and txn.account.user_id == session['user_id']:
-            db.session.delete(txn)
-    db.session.commit()
+    deleted = delete_user_transactions(session['user_id'], txn_ids)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({"deleted": deleted})
     return redirect(url_for('dashboard', filter_account_id=filter_account_id))
 
 # --- Adding New Bank Account ---
@@ -455,9 +1252,10 @@ def add_account():
     user = User.query.get(session['user_id'])
     name = request.form['name']
     account_type = request.form['type']
-    new_account = Account(name=name, type=account_type, initial_balance=0.0, user_id=user.id)
+    new_account = Account(name=name, type=account_type, initial_balance=0, current_balance=0, user_id=user.id)
     db.session.add(new_account)
     db.session.commit()
+    invalidate_user_cache(user.id)
     return redirect(url_for('dashboard'))
 
 # --- Remove Bank Account ---
@@ -467,129 +1265,357 @@ def remove_account(account_id):
         return redirect(url_for('login'))
     account = Account.query.get(account_id)
     if account and account.user_id == session['user_id']:
+        db.session.execute(delete(MonthlyCategoryTotal).where(MonthlyCategoryTotal.account_id == account.id))
+        db.session.execute(delete(CategoryRule).where(CategoryRule.account_id == account.id))
         db.session.delete(account)
         db.session.commit()
+        invalidate_user_cache(session['user_id'])
     return redirect(url_for('dashboard'))
 
+# --- Category Rules ---
+category_matchers = categorize.MatcherCache()
+
+def rule_matcher(user_id):
+    """The user's compiled rule matcher; recompiled only when the rules have changed."""
+    rules = (db.session.query(CategoryRule.category, CategoryRule.match_type, CategoryRule.pattern,
+                              CategoryRule.min_amount, CategoryRule.max_amount, CategoryRule.account_id)
+                       .filter(CategoryRule.user_id == user_id)
+                       .order_by(CategoryRule.priority, CategoryRule.id)
+                       .all())
+    return category_matchers.get(user_id, (categorize.Rule(*rule) for rule in rules))
+
+def category_rule_dict(rule):
+    return {
+        "id": rule.id,
+        "category": rule.category,
+        "match_type": rule.match_type,
+        "pattern": rule.pattern,
+        "min_amount": from_cents(rule.min_amount),
+        "max_amount": from_cents(rule.max_amount),
+        "account_id": rule.account_id,
+        "priority": rule.priority,
+    }
+
+@app.route('/category_rules', methods=['GET', 'POST'])
+def category_rules():
+    """List the user's rules, or add one from JSON/form fields (amounts in units)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    user_id = session['user_id']
+    if request.method == 'GET':
+        rules = (CategoryRule.query.filter_by(user_id=user_id)
+                             .order_by(CategoryRule.priority, CategoryRule.id).all())
+        return jsonify({"rules": [category_rule_dict(rule) for rule in rules]})
+
+    fields = request.get_json(silent=True) or request.form
+    try:
+        min_amount, max_amount = (to_cents(fields[name]) if fields.get(name) not in (None, '') else None
+                                  for name in ('min_amount', 'max_amount'))
+        account_id = int(fields['account_id']) if fields.get('account_id') not in (None, '') else None
+        priority = int(fields.get('priority') or 0)
+    except (ValueError, TypeError, ArithmeticError):
+        return jsonify({"error": "min_amount, max_amount, account_id and priority must be numbers."}), 400
+    if account_id is not None and not Account.query.filter_by(id=account_id, user_id=user_id).first():
+        return jsonify({"error": "Unknown account."}), 400
+    rule = CategoryRule(user_id=user_id, category=(fields.get('category') or '').strip(),
+                        match_type=fields.get('match_type') or categorize.SUBSTRING,
+                        pattern=fields.get('pattern') or None, min_amount=min_amount, max_amount=max_amount,
+                        account_id=account_id, priority=priority)
+    try:
+        categorize.validate(categorize.Rule(rule.category, rule.match_type, rule.pattern,
+                                            min_amount, max_amount, account_id))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    db.session.add(rule)
+    db.session.commit()
+    return jsonify(category_rule_dict(rule)), 201
+
+@app.route('/category_rules/<int:rule_id>', methods=['DELETE'])
+def remove_category_rule(rule_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    rule = db.session.get(CategoryRule, rule_id)
+    if rule is None or rule.user_id != session['user_id']:
+        return jsonify({"error": "Unknown rule."}), 404
+    db.session.delete(rule)
+    db.session.commit()
+    return '', 204
+
 # --- Importing Transactions From File ---
+# Uploads are spooled to a temporary file and imported by a background job on
+# the APScheduler thread pool; /jobs/<id> reports progress.
+IMPORT_EXTENSIONS = ('.csv', '.tsv', '.xls', '.xlsx', '.parquet')
+import_jobs = JobRegistry(max_jobs=app.config['IMPORT_JOB_HISTORY'])
+
+def csv_records(path, delimiter):
+    """Yield (account, date, amount_cents, description, category) per CSV/TSV row.
+
+    Dates are MM-DD-YYYY; an unparseable date or amount comes through as None.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f, delimiter=delimiter):
+            try:
+                txn_date = datetime.strptime(row['Date'], '%m-%d-%Y').date()
+                amount = to_cents(row['Amount'])
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                txn_date = amount = None
+            yield row.get('Account', ''), txn_date, amount, row.get('Description'), row.get('Category')
+
+def import_records(job, records):
+    """Stream parsed rows into the job's user's accounts, committing every IMPORT_CHUNK_SIZE rows.
+
+    records yields (account, date, amount_cents, description, category), as
+    csv_records() and columnar.read_parquet() do.
+
+    Rows with an unknown account or an unparseable date/amount are counted as
+    skipped; blank categories are filled in by the user's category rules. Rows
+    already stored (same fingerprint) are dropped with one lookup per chunk and
+    counted as duplicates. Each chunk adds its total to current_balance in SQL
+    and chains its rows' running balances from the balance found there, so
+    writes made through the UI while the import runs are kept. Accounts that
+    received rows dated before their latest transaction are rebalanced at the
+    end, also after a failure so the chunks already committed stay consistent.
+    """
+    accounts = accounts_by_name(job.user_id)
+    accounts_by_id = {account.id: account for account in accounts.values()}
+    matcher = rule_matcher(job.user_id)
+    rebalance_from = {}
+    occurrences = {}
+    pending = []
+
+    def commit_chunk():
+        fingerprint_rows(pending, occurrences)
+        stored = stored_fingerprints(row['fingerprint'] for row in pending)
+        rows = [row for row in pending if row['fingerprint'] not in stored]
+        job.rows_duplicate += len(pending) - len(rows)
+        deltas = {}
+        for row in rows:
+            account = accounts_by_id[row['account_id']]
+            deltas[account.id] = deltas.get(account.id, 0) + balance_sign(account) * row['amount']
+        # Re-read per chunk, after the balance UPDATEs have locked the accounts:
+        # other writers may have touched them since the last chunk.
+        balances = {account_id: add_to_current_balance(account_id, delta) for account_id, delta in deltas.items()}
+        latest_dates = latest_transaction_dates(list(deltas))
+        for row in rows:
+            account = accounts_by_id[row['account_id']]
+            row['balance'] = balances[account.id] + balance_sign(account) * row['amount']
+            balances[account.id] = row['balance']
+            # Rows older than the account's latest one need a rebalance afterwards.
+            latest = latest_dates.get(account.id)
+            if latest is not None and row['date'] < latest:
+                rebalance_from[account.id] = min(row['date'], rebalance_from.get(account.id, row['date']))
+            latest_dates[account.id] = max(row['date'], latest or row['date'])
+        bulk_insert_transactions(rows)
+        db.session.commit()
+        job.rows_inserted += len(rows)
+        pending.clear()
+
+    try:
+        for account_name, txn_date, amount, description, category in records:
+            job.rows_parsed += 1
+            account = accounts.get(account_name)
+            if not account or txn_date is None or amount is None:
+                job.rows_skipped += 1
+                continue
+            description = description or ''
+            category = (category or '').strip()
+            if not category:
+                category = matcher.categorize(description, amount, account.id) or ''
+            pending.append({
+                'date': txn_date,
+                'description': description,
+                'amount': amount,
+                'category': category,
+                'account_id': account.id,
+                'is_recurring': False,
+            })
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                commit_chunk()
+        commit_chunk()
+    except Exception:
+        db.session.rollback()  # discards the half-written chunk
+        raise
+    finally:
+        for account_id, start in rebalance_from.items():
+            rebalance_account(accounts_by_id[account_id], (start, 0))
+        db.session.commit()
+
+def import_excel_file(job, path):
+    """Import every sheet with the expected columns; amounts and balances are taken from the file.
+
+    Blank categories are filled in by the user's category rules; rows still
+    without one are skipped. Rows already stored are dropped by fingerprint,
+    as in import_records(). Accounts that received rows dated before their
+    latest transaction are rebalanced from the earliest such row, and accounts
+    whose initial balance a "Balance" row changed are rebalanced from the start,
+    also after a failure.
+
+    Excel workbooks cannot be read incrementally by pandas, so the sheets are
+    parsed up front and the rows inserted in committed chunks.
+    """
+    with measure_import(job, "Excel import"):
+        sheets_dict = pd.read_excel(path, sheet_name=None)
+        expected_cols = ['Date', 'Bank', 'Where/When', 'Money Earn/Spent', 'Balance', 'Category']
+        sheet_dfs = []
+        for sheet_name, df_sheet in sheets_dict.items():
+            df_sheet.columns = df_sheet.columns.astype(str).str.strip()
+            if not set(expected_cols).issubset(df_sheet.columns):
+                app.logger.warning("Skipping sheet '%s' because it doesn't contain all expected columns. Found columns: %s",
+                                   sheet_name, df_sheet.columns.tolist())
+                continue
+            df_sheet = df_sheet[expected_cols]
+            sheet_dfs.append(df_sheet)
+        if not sheet_dfs:
+            raise ValueError(f"No sheet has the expected columns: {', '.join(expected_cols)}.")
+        df = pd.concat(sheet_dfs, ignore_index=True)
+        del sheets_dict, sheet_dfs
+        job.rows_parsed = len(df)
+        df.rename(columns={
+            'Bank': 'Account',
+            'Where/When': 'Description',
+            'Money Earn/Spent': 'Amount'
+        }, inplace=True)
+        # Coerce whole columns at once; unparseable values become NaN/NaT and are dropped.
+        df['Date'] = pd.to_datetime(df['Date'], format='%m-%d-%Y', errors='coerce').dt.date
+        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+        df['Balance'] = pd.to_numeric(df['Balance'], errors='coerce')
+        df.dropna(subset=['Date', 'Account', 'Description', 'Amount', 'Balance'], inplace=True)
+        # Spreadsheet amounts are in units; the database stores integer cents.
+        df['Amount'] = series_to_cents(df['Amount'])
+        df['Balance'] = series_to_cents(df['Balance'])
+        # Map account names to ids with one query and an inner merge (drops unknown accounts).
+        accounts = pd.DataFrame(
+            db.session.query(Account.name, Account.id)
+                      .filter(Account.user_id == job.user_id)
+                      .order_by(Account.id)
+                      .all(),
+            columns=['Account', 'account_id']
+        ).drop_duplicates('Account')
+        df = df.merge(accounts, on='Account', how='inner')
+        blank = df['Category'].isna() | (df['Category'].astype(str).str.strip() == '')
+        if blank.any():
+            matcher = rule_matcher(job.user_id)
+            df.loc[blank, 'Category'] = [
+                matcher.categorize(description, amount, account_id)
+                for description, amount, account_id in zip(df.loc[blank, 'Description'].astype(str),
+                                                            df.loc[blank, 'Amount'], df.loc[blank, 'account_id'])
+            ]
+            df = df.dropna(subset=['Category'])
+        job.rows_skipped = job.rows_parsed - len(df)
+        # The first "Balance" row per account sets that account's initial balance.
+        is_balance_row = df['Description'] == "Balance"
+        opening = df.loc[is_balance_row].drop_duplicates('account_id')
+        account_ids = accounts['account_id'].tolist()
+        initial_balances = dict(db.session.query(Account.id, Account.initial_balance)
+                                          .filter(Account.id.in_(account_ids)))
+        # account id -> (date, id) key to rebalance from; None means from the initial balance.
+        rebalance_from = {}
+        if not opening.empty:
+            changed = [{'id': int(account_id), 'initial_balance': int(balance)}
+                       for account_id, balance in zip(opening['account_id'], opening['Balance'])
+                       if int(balance) != (initial_balances[int(account_id)] or 0)]
+            if changed:
+                db.session.execute(update(Account), changed)
+                rebalance_from.update((row['id'], None) for row in changed)
+        df = df.loc[~is_balance_row]
+        rows = pd.DataFrame({
+            'date': df['Date'],
+            'description': df['Description'].astype(str),
+            'amount': df['Amount'],
+            'balance': df['Balance'],
+            'category': df['Category'].astype(str),
+            'account_id': df['account_id'].astype(int),
+            'is_recurring': False,
+        }).to_dict('records')
+        latest_dates = latest_transaction_dates(account_ids)
+        occurrences = {}
+        try:
+            for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+                chunk = rows[start:start + IMPORT_CHUNK_SIZE]
+                fingerprint_rows(chunk, occurrences)
+                stored = stored_fingerprints(row['fingerprint'] for row in chunk)
+                new_rows = [row for row in chunk if row['fingerprint'] not in stored]
+                job.rows_duplicate += len(chunk) - len(new_rows)
+                # Rows older than the account's latest existing one shift that row's balance.
+                for row in new_rows:
+                    latest = latest_dates.get(row['account_id'])
+                    if latest is not None and row['date'] < latest:
+                        key = (row['date'], 0)
+                        current = rebalance_from.get(row['account_id'], key)
+                        rebalance_from[row['account_id']] = None if current is None else min(current, key)
+                bulk_insert_transactions(new_rows)
+                refresh_current_balances(account_ids)
+                db.session.commit()
+                job.rows_inserted += len(new_rows)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            for account in Account.query.filter(Account.id.in_(list(rebalance_from))):
+                rebalance_account(account, rebalance_from[account.id])
+            refresh_current_balances(account_ids)
+            db.session.commit()
+
+def run_import_job(job_id, path):
+    """Scheduler entry point: import the spooled upload and record the outcome on the job."""
+    job = import_jobs.get(job_id)
+    with app.app_context():
+        job.start()
+        try:
+            if job.filename.endswith(('.csv', '.tsv')):
+                import_records(job, csv_records(path, ',' if job.filename.endswith('.csv') else '\t'))
+            elif job.filename.endswith('.parquet'):
+                import_records(job, columnar.read_parquet(path, IMPORT_CHUNK_SIZE))
+            else:
+                import_excel_file(job, path)
+        except Exception as e:
+            app.logger.exception("Import job %s (%s) failed", job.id, job.filename)
+            job.finish(error=str(e))
+        else:
+            app.logger.info("Import job %s (%s): %d rows inserted, %d duplicates, %d skipped",
+                            job.id, job.filename, job.rows_inserted, job.rows_duplicate, job.rows_skipped)
+            job.finish()
+        finally:
+            os.remove(path)
+            invalidate_user_cache(job.user_id)
+
 @app.route('/import_transactions', methods=['POST'])
 def import_transactions():
     if 'user_id' not in session:
         return redirect(url_for('login'))
+    wants_json = request.accept_mimetypes.best == 'application/json'
     file = request.files.get('file')
-    if not file:
+    if not file or not file.filename.lower().endswith(IMPORT_EXTENSIONS):
+        if wants_json:
+            return jsonify({"error": f"Upload a file ending in {', '.join(IMPORT_EXTENSIONS)}."}), 400
         return redirect(url_for('dashboard'))
     filename = file.filename.lower()
-    try:
-        if filename.endswith('.csv') or filename.endswith('.tsv'):
-            delimiter = ',' if filename.endswith('.csv') else '\t'
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream, delimiter=delimiter)
-            for row in csv_input:
-                # Parse the date using MM-DD-YYYY format.
-                txn_date = datetime.strptime(row['Date'], '%m-%d-%Y').date()
-                description = row.get('Description', '')
-                amount = float(row['Amount'])
-                category = row.get('Category', '')
-                account_name = row.get('Account', '')
-                account = Account.query.filter_by(user_id=session['user_id'], name=account_name).first()
-                if not account:
-                    continue
-                last_txn = Transaction.query.filter_by(account_id=account.id).order_by(Transaction.date.desc(), Transaction.id.desc()).first()
-                if last_txn:
-                    new_balance = last_txn.balance + amount
-                else:
-                    new_balance = account.initial_balance + amount
-                new_txn = Transaction(
-                    date=txn_date,
-                    description=description,
-                    amount=amount,
-                    balance=new_balance,
-                    category=category,
-                    account_id=account.id
-                )
-                db.session.add(new_txn)
-            db.session.commit()
-        elif filename.endswith('.xls') or filename.endswith('.xlsx'):
-            sheets_dict = pd.read_excel(file, sheet_name=None)
-            expected_cols = ['Date', 'Bank', 'Where/When', 'Money Earn/Spent', 'Balance', 'Category']
-            sheet_dfs = []
-            for sheet_name, df_sheet in sheets_dict.items():
-                df_sheet.columns = df_sheet.columns.astype(str).str.strip()
-                if not set(expected_cols).issubset(df_sheet.columns):
-                    print(f"Skipping sheet '{sheet_name}' because it doesn't contain all expected columns. Found columns: {df_sheet.columns.tolist()}")
-                    continue
-                df_sheet = df_sheet[expected_cols]
-                sheet_dfs.append(df_sheet)
-            if not sheet_dfs:
-                print("No valid sheets found with the expected columns.")
-                return redirect(url_for('dashboard'))
-            df = pd.concat(sheet_dfs, ignore_index=True)
-            df.rename(columns={
-                'Bank': 'Account',
-                'Where/When': 'Description',
-                'Money Earn/Spent': 'Amount'
-            }, inplace=True)
-            df['Date'] = pd.to_datetime(df['Date'], format='%m-%d-%Y', errors='coerce').dt.date
-            df.dropna(subset=['Date', 'Account', 'Description', 'Amount', 'Balance', 'Category'], inplace=True)
-            for account_name in df['Account'].unique():
-                df_account = df[df['Account'] == account_name]
-                balance_rows = df_account[df_account['Description'] == "Balance"]
-                if not balance_rows.empty:
-                    initial_balance = balance_rows.iloc[0]['Balance']
-                    account_obj = Account.query.filter_by(user_id=session['user_id'], name=account_name).first()
-                    if account_obj:
-                        account_obj.initial_balance = initial_balance
-                    df = df.drop(balance_rows.index)
-            for index, row in df.iterrows():
-                txn_date = row['Date']
-                description = row['Description']
-                try:
-                    amount = float(row['Amount'])
-                except Exception as e:
-                    continue
-                category = row.get('Category', '')
-                account_name = row['Account']
-                account_obj = Account.query.filter_by(user_id=session['user_id'], name=account_name).first()
-                if not account_obj:
-                    continue
-                try:
-                    imported_balance = float(row['Balance'])
-                except Exception as e:
-                    continue
-                new_txn = Transaction(
-                    date=txn_date,
-                    description=description,
-                    amount=amount,
-                    balance=imported_balance,
-                    category=category,
-                    account_id=account_obj.id
-                )
-                db.session.add(new_txn)
-            db.session.commit()
-            print("Import complete.")
-        else:
-            pass
-    except Exception as e:
-        print("Error processing file:", e)
-    return redirect(url_for('dashboard'))
+    # Spool to disk so the job reads the file in chunks instead of holding it in memory.
+    fd, path = tempfile.mkstemp(prefix='budget-import-', suffix=os.path.splitext(filename)[1])
+    with os.fdopen(fd, 'wb') as f:
+        file.save(f)
+    job = import_jobs.create(session['user_id'], filename)
+    # No misfire grace limit: a job waiting for a free pool thread must still run.
+    scheduler.add_job(id=f'import-{job.id}', func=run_import_job, args=[job.id, path],
+                      trigger='date', misfire_grace_time=None)
+    if wants_json:
+        return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+    return redirect(url_for('dashboard', import_job=job.id))
 
-def next_recurring(rec_date, frequency):
-    if rec_date is None:
-        return None
-    if frequency == 'monthly':
-        return rec_date + relativedelta(months=+1)
-    elif frequency == 'yearly':
-        return rec_date + relativedelta(years=+1)
-    else:
-        return rec_date
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    job = import_jobs.get(job_id)
+    if job is None or job.user_id != session['user_id']:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job.to_dict())
 
 def datetimeformat(value, format='%m-%d-%Y'):
     if value is None:
         return "N/A"
     return value.strftime(format)
 
-app.jinja_env.filters['next_recurring'] = next_recurring
 app.jinja_env.filters['datetimeformat'] = datetimeformat
 
 # Stable color for chart_data
@@ -602,10 +1628,12 @@ def stable_color(category):
 
 # --- Chart Data Endpoint for Current Month ---
 @app.route('/chart_data/<month_year>')
+@etag_json(per_account=True)
+@cached_json(per_account=True)
 def chart_data(month_year):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
+    user = current_user_with_accounts()
     # Get account_id from query parameters; if not provided, use first account.
     account_id = request.args.get('account_id')
     if account_id:
@@ -629,19 +1657,17 @@ def chart_data(month_year):
         return jsonify({"error": "Invalid month-year format. Use MM-YYYY."}), 400
 
     results = db.session.query(
-        func.strftime('%m-%Y', Transaction.date).label('month'),
-        Transaction.category,
-        func.sum(Transaction.amount).label('total')
+        MonthlyCategoryTotal.category,
+        func.sum(MonthlyCategoryTotal.total).label('total')
     ).filter(
-        Transaction.date >= start_date,
-        Transaction.date <= end_date,
-        Transaction.account_id.in_(account_ids)
-    ).group_by(Transaction.category).all()
+        MonthlyCategoryTotal.account_id.in_(account_ids),
+        MonthlyCategoryTotal.year_month == month_key(start_date)
+    ).group_by(MonthlyCategoryTotal.category).all()
 
     spent_map = {}
     income_map = {}
     categories_set = set()
-    for m, category, total in results:
+    for category, total in results:
         categories_set.add(category)
         if total < 0:
             spent_map[category] = spent_map.get(category, 0) + abs(total)
@@ -656,14 +1682,14 @@ def chart_data(month_year):
         if spent_val > 0:
             datasets.append({
                 "label": f"{cat} Spent",
-                "data": [spent_val],
+                "data": [from_cents(spent_val)],
                 "backgroundColor": stable_color(cat),
                 "stack": "SpentStack"
             })
         if income_val > 0:
             datasets.append({
                 "label": f"{cat} Income",
-                "data": [income_val],
+                "data": [from_cents(income_val)],
                 "backgroundColor": stable_color(cat),
                 "stack": "IncomeStack"
             })
@@ -673,11 +1699,16 @@ def chart_data(month_year):
 
 
 # --- Chart Data Prediction Endpoint ---
+DEFAULT_PREDICTION_LOOKBACK = 4
+MAX_PREDICTION_LOOKBACK = 60
+
 @app.route('/chart_data/prediction')
+@etag_json(per_account=True)
+@cached_json(per_account=True)
 def chart_data_prediction():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
+    user = current_user_with_accounts()
     
     # Get target month_year and account_id from query parameters.
     month_year = request.args.get('month_year')
@@ -702,97 +1733,75 @@ def chart_data_prediction():
     except Exception as e:
         return jsonify({"error": "Invalid month-year format. Use MM-YYYY."}), 400
 
-    # Define last 4 months: target month minus 3 up to target month.
-    months = []
-    for i in range(3, -1, -1):
-        m_date = date(year, month, 1) - relativedelta(months=i)
-        months.append(m_date)
+    # History window: the target month and the lookback - 1 months before it.
+    try:
+        lookback = int(request.args.get('lookback', DEFAULT_PREDICTION_LOOKBACK))
+    except ValueError:
+        return jsonify({"error": "lookback must be a number of months."}), 400
+    lookback = max(1, min(lookback, MAX_PREDICTION_LOOKBACK))
+    model = request.args.get('model', 'mean')
+    if model not in forecast.MODELS:
+        return jsonify({"error": f"Unknown model. Use one of: {', '.join(forecast.MODELS)}."}), 400
+    # The seasonal model needs a full year of history even when fewer months are shown.
+    history_length = max(lookback, forecast.SEASON_LENGTH) if model == 'seasonal' else lookback
+    target_date = date(year, month, 1)
+    history = [target_date - relativedelta(months=i) for i in range(history_length - 1, -1, -1)]
+    months = history[-lookback:]
     labels = [d.strftime('%b %Y') for d in months]
+    next_month_date = target_date + relativedelta(months=+1)
 
-    # Build mapping: data_map[(month_str, category)] = total
-    data_map = {}
-    for m in months:
-        start_date = m
-        end_date = (m + relativedelta(months=+1)) - timedelta(days=1)
-        results = db.session.query(
-            func.strftime('%m-%Y', Transaction.date).label('m_str'),
-            Transaction.category,
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.date >= start_date,
-            Transaction.date <= end_date,
-            Transaction.account_id.in_(account_ids)
-        ).group_by(func.strftime('%m-%Y', Transaction.date), Transaction.category).all()
-        for m_str, category, total in results:
-            data_map[(m_str, category)] = total
-
-    all_categories = set(cat for (_, cat) in data_map.keys())
-
-    category_data = {}
-    for cat in all_categories:
-        values = []
-        for m in months:
-            key = m.strftime('%m-%Y')
-            val = data_map.get((key, cat), 0)
-            values.append(val)
-        category_data[cat] = values
-
-    # Check if next month already has data.
-    targetDate = date(year, month, 1)
-    next_month_date = targetDate + relativedelta(months=+1)
-    next_start = next_month_date
-    next_end = (next_start + relativedelta(months=+1)) - timedelta(days=1)
-    next_results = db.session.query(
-        Transaction.category,
-        func.sum(Transaction.amount).label('total')
+    # One range query over the history window plus next month, bucketed by month and category.
+    results = db.session.query(
+        MonthlyCategoryTotal.year_month,
+        MonthlyCategoryTotal.category,
+        func.sum(MonthlyCategoryTotal.total).label('total')
     ).filter(
-        Transaction.date >= next_start,
-        Transaction.date <= next_end,
-        Transaction.account_id.in_(account_ids)
-    ).group_by(Transaction.category).all()
+        MonthlyCategoryTotal.account_id.in_(account_ids),
+        MonthlyCategoryTotal.year_month >= month_key(history[0]),
+        MonthlyCategoryTotal.year_month <= month_key(next_month_date)
+    ).group_by(MonthlyCategoryTotal.year_month, MonthlyCategoryTotal.category).all()
+
+    next_data = {category: total for year_month, category, total in results
+                 if year_month == month_key(next_month_date)}
+    history_rows = [row for row in results if row[0] != month_key(next_month_date)]
+    categories, matrix = forecast.build_matrix(
+        [row[0] for row in history_rows],
+        [row[1] for row in history_rows],
+        [row[2] for row in history_rows],
+        [month_key(m) for m in history]
+    )
+    shown = matrix[:, -lookback:]
 
     barDatasets = []
-    for cat, values in category_data.items():
+    for cat, values in zip(categories, shown.tolist()):
         color = stable_color(cat)
-        # Bar dataset for actual values for the 4 months; append 0 for next month initially.
+        # Bar dataset for actual values over the window; next month's actual (or 0) last.
         barDatasets.append({
             "label": f"{cat} Actual",
-            "data": values + [0],
+            "data": [from_cents(v) for v in values] + [from_cents(next_data.get(cat, 0))],
             "backgroundColor": color,
             "stack": "ActualStack"
         })
 
     lineDatasets = []
-    if next_results:
-        # If actual data exists for next month, update the bar datasets with that value.
-        next_data = { category: total for category, total in next_results }
-        for ds in barDatasets:
-            # Extract category name from label (remove trailing " Spent" or " Income")
-            let_cat = ds["label"].replace(" Spent", "").replace(" Income", "")
-            ds["data"][-1] = next_data.get(let_cat, 0)
-        # No prediction line is added.
-    else:
-        # No data for next month; compute prediction from the last 4 months.
-        prediction = {}
-        std = {}
-        for cat, values in category_data.items():
-            mean_val = sum(values) / len(values)
-            variance = sum((x - mean_val) ** 2 for x in values) / len(values)
-            prediction[cat] = mean_val
-            std[cat] = math.sqrt(variance)
-        for cat, values in category_data.items():
-            color = stable_color(cat)
-            lineData = [None] * len(values)
-            lineData.append(prediction[cat])
+    std = {}
+    lower = {}
+    upper = {}
+    if not next_data and categories:
+        # No data for next month; forecast every category at once from the history matrix (in units).
+        prediction, spread, low, high = forecast.forecast(matrix / 100, model)
+        for i, cat in enumerate(categories):
+            std[cat] = float(spread[i])
+            lower[cat] = float(low[i])
+            upper[cat] = float(high[i])
             lineDatasets.append({
                 "label": f"{cat} Predicted",
-                "data": lineData,
-                "borderColor": color,
+                "data": [None] * lookback + [float(prediction[i])],
+                "borderColor": stable_color(cat),
                 "fill": False,
                 "type": "line"
             })
-        # std can be returned if needed.
-    
+
     # Append next month's label.
     labels.append(next_month_date.strftime('%b %Y'))
 
@@ -800,15 +1809,36 @@ def chart_data_prediction():
         "labels": labels,
         "barDatasets": barDatasets,
         "lineDatasets": lineDatasets,
-        "std": {} if next_results else std
+        "model": model,
+        "std": std,
+        "lower": lower,
+        "upper": upper
+    })
+
+# --- Response Cache Statistics ---
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+# --- Request Metrics (Prometheus text format) ---
+@app.route('/metrics')
+def metrics():
+    cache = response_cache.stats()
+    body = request_metrics.render({
+        'budget_response_cache_hits_total': ('counter', "Response cache hits.", cache['hits']),
+        'budget_response_cache_misses_total': ('counter', "Response cache misses.", cache['misses']),
+        'budget_response_cache_invalidations_total': ('counter', "Response cache entries dropped by writes.",
+                                                      cache['invalidations']),
+        'budget_response_cache_entries': ('gauge', "Entries currently in the response cache.", cache['entries']),
     })
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 # --- Data Page Routes ---
 @app.route('/data/<month_year>')
 def data_page(month_year):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
+    user = current_user_with_accounts()
     # Pass month_year as current_month and selected_month
     return render_template("data.html", current_month=month_year, selected_month=month_year, user=user)
 
@@ -823,4 +1853,5 @@ def data_default():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        ensure_schema()
     app.run(debug=True)
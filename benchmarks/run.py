@@ -0,0 +1,270 @@
+"""End-to-end route benchmark against a synthetic ledger. Prints JSON.
+
+Generates one user with N accounts and `--years` of history at `--per-day`
+transactions per account per day into a temporary SQLite database, then
+drives the real routes through the Flask test client and reports p50/p95
+latency, SQL statement counts and peak traced memory per route.
+
+    python benchmarks/run.py --accounts 10 --years 10 --per-day 50 --iterations 20
+    python benchmarks/run.py --years 1 --per-day 5 --output before.json
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ['Dine Out', 'Groceries', 'Utilities', 'Entertainment', 'Transport', 'Rent', 'Miscellaneous']
+DESCRIPTIONS = ['Coffee shop', 'Supermarket', 'Power bill', 'Cinema', 'Train ticket', 'Landlord', 'Hardware store']
+INSERT_CHUNK_SIZE = 10000
+
+
+def generate_ledger(app_module, accounts, years, per_day, seed):
+    """Create user 'bench' with `accounts` accounts and their transaction history.
+
+    Balances are chained while generating, so no rebalance pass is needed;
+    the monthly rollup is rebuilt once at the end. Returns the row count.
+    """
+    from sqlalchemy import insert
+
+    db, User, Account, Transaction = app_module.db, app_module.User, app_module.Account, app_module.Transaction
+    rng = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+
+    user = User(username='bench', password='bench')
+    db.session.add(user)
+    db.session.flush()
+    account_rows = [Account(name=f'Account {i + 1}', type='credit' if i % 4 == 3 else 'debit',
+                            initial_balance=100000, current_balance=100000, user_id=user.id)
+                    for i in range(accounts)]
+    db.session.add_all(account_rows)
+    db.session.flush()
+
+    total = 0
+    occurrences = {}
+    for account in account_rows:
+        sign = app_module.balance_sign(account)
+        balance = account.initial_balance
+        chunk = []
+        day = start
+        while day <= end:
+            for _ in range(per_day):
+                kind = rng.randrange(len(CATEGORIES))
+                amount = rng.randint(-12000, 8000)  # cents
+                balance += sign * amount
+                chunk.append({
+                    'date': day,
+                    'description': DESCRIPTIONS[kind],
+                    'amount': amount,
+                    'balance': balance,
+                    'category': CATEGORIES[kind],
+                    'account_id': account.id,
+                    'is_recurring': False,
+                })
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                app_module.fingerprint_rows(chunk, occurrences)
+                db.session.execute(insert(Transaction), chunk)
+                total += len(chunk)
+                chunk = []
+            day += timedelta(days=1)
+        if chunk:
+            app_module.fingerprint_rows(chunk, occurrences)
+            db.session.execute(insert(Transaction), chunk)
+            total += len(chunk)
+        account.current_balance = balance
+    app_module.rebuild_monthly_totals()
+    db.session.commit()
+    return total
+
+
+def upload_rows(rows, accounts, seed):
+    """(date, account, description, cents, category) rows for an upload, dated today so they append
+    without a rebalance."""
+    rng = random.Random(seed)
+    today = date.today()
+    for _ in range(rows):
+        kind = rng.randrange(len(CATEGORIES))
+        yield today, f'Account {rng.randrange(accounts) + 1}', DESCRIPTIONS[kind], rng.randint(-12000, 8000), CATEGORIES[kind]
+
+
+def import_csv(rows, accounts, seed):
+    """A CSV upload in the importer's format."""
+    lines = ['Date,Account,Description,Amount,Category']
+    for day, account, description, cents, category in upload_rows(rows, accounts, seed):
+        lines.append(f"{day.strftime('%m-%d-%Y')},{account},{description},{cents / 100:.2f},{category}")
+    return '\n'.join(lines).encode()
+
+
+def import_parquet(rows, accounts, seed):
+    """The same upload as import_csv() in the /export?format=parquet layout (Balance is ignored on import)."""
+    import columnar
+
+    return b''.join(columnar.write_parquet(
+        (day, account, description, cents, 0, category)
+        for day, account, description, cents, category in upload_rows(rows, accounts, seed)))
+
+
+def scenarios(args):
+    """(name, request) pairs; each request takes the test client and returns a response."""
+    month_year = date.today().strftime('%m-%Y')
+    upload = import_csv(args.import_rows, args.accounts, args.seed)
+    # A fresh file per request, so every row is new rather than a duplicate of an earlier upload.
+    seeds = itertools.count(args.seed + 1)
+    fresh_uploads = (import_csv(args.import_rows, args.accounts, seed) for seed in seeds)
+    fresh_parquet_uploads = (import_parquet(args.import_rows, args.accounts, seed) for seed in seeds)
+    return [
+        ('dashboard', lambda c: c.get('/dashboard')),
+        ('dashboard_account', lambda c: c.get('/dashboard?filter_account_id=1')),
+        ('dashboard_data', lambda c: c.get('/dashboard_data')),
+        ('chart_data', lambda c: c.get(f'/chart_data/{month_year}?account_id=1')),
+        ('chart_data_prediction', lambda c: c.get(f'/chart_data/prediction?month_year={month_year}&account_id=1')),
+        ('export', lambda c: c.get('/export')),
+        ('export_parquet', lambda c: c.get('/export?format=parquet')),
+        ('search', lambda c: c.get('/search?q=coffee')),
+        ('import_transactions', lambda c: run_import(c, next(fresh_uploads))),
+        ('import_transactions_parquet', lambda c: run_import(c, next(fresh_parquet_uploads), 'bench.parquet')),
+        # After the first request every row is already stored and skipped by fingerprint.
+        ('import_transactions_duplicate', lambda c: run_import(c, upload)),
+    ]
+
+
+def run_import(client, upload, filename='bench.csv'):
+    """Upload a file and wait for its background job; returns the final /jobs/<id> response."""
+    response = client.post('/import_transactions', content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'},
+                           data={'file': (io.BytesIO(upload), filename)})
+    if response.status_code != 202:
+        return response
+    status_url = response.get_json()['status_url']
+    response.close()
+    while True:
+        response = client.get(status_url)
+        job = response.get_json()
+        if job['status'] == 'failed':
+            raise RuntimeError(f"import job failed: {job['error']}")
+        if job['status'] == 'finished':
+            return response
+        response.close()
+        time.sleep(0.005)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def measure(app_module, engine, client, request, args):
+    from querycount import QueryCounter
+
+    latencies = []
+    queries = []
+    for i in range(args.warmup + args.iterations):
+        if not args.keep_cache:
+            app_module.response_cache.clear()
+        with QueryCounter(engine) as counter:
+            begin = time.perf_counter()
+            response = request(client)
+            body = response.get_data()  # drain streamed bodies such as /export
+            response.close()  # gives streamed bodies' connections back to the pool
+            elapsed = time.perf_counter() - begin
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code} from benchmark request')
+        if i >= args.warmup:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+
+    # Peak memory comes from a separate traced run; tracing would skew the timings above.
+    if not args.keep_cache:
+        app_module.response_cache.clear()
+    tracemalloc.start()
+    response = request(client)
+    response.get_data()
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'queries': max(queries),
+        'response_bytes': len(body),
+        'peak_memory_mb': round(peak / 1e6, 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--per-day', type=int, default=50, help='transactions per account per day')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--import-rows', type=int, default=1000, help='rows per /import_transactions upload')
+    parser.add_argument('--keep-cache', action='store_true',
+                        help='let the response cache serve repeated requests instead of clearing it')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads its database URI at import time.
+        os.environ['BUDGET_SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        import app as app_module
+
+        # Imports run on the scheduler's thread pool; only the daily recurring job is unwanted.
+        app_module.scheduler.remove_job('RecurringTransactionJob')
+        app = app_module.app
+        with app.app_context():
+            app_module.db.create_all()
+            started = time.perf_counter()
+            rows = generate_ledger(app_module, args.accounts, args.years, args.per_day, args.seed)
+            generate_seconds = time.perf_counter() - started
+            engine = app_module.db.engine
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'bench'})
+        routes = {name: measure(app_module, engine, client, request, args)
+                  for name, request in scenarios(args)}
+        app_module.scheduler.shutdown()
+        with app.app_context():
+            app_module.db.engine.dispose()
+
+    report = {
+        'revision': git_revision(),
+        'ledger': {'accounts': args.accounts, 'years': args.years, 'per_day': args.per_day,
+                   'rows': rows, 'generate_seconds': round(generate_seconds, 2)},
+        'iterations': args.iterations,
+        'response_cache': 'kept' if args.keep_cache else 'cleared',
+        'upload_bytes': {'csv': len(import_csv(args.import_rows, args.accounts, args.seed)),
+                         'parquet': len(import_parquet(args.import_rows, args.accounts, args.seed))},
+        'routes': routes,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
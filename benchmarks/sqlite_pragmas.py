@@ -0,0 +1,127 @@
+"""Read-heavy SQLite benchmark: default settings vs. the pragmas in db_config.
+
+Readers run the chart/dashboard-style category sum while one writer commits
+small transactions, the way the recurring job and imports do. Prints JSON.
+
+    python benchmarks/sqlite_pragmas.py --rows 200000 --seconds 5 --readers 4
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import DatabaseConfig, apply_sqlite_pragmas, sqlite_pragmas  # noqa: E402
+
+CATEGORIES = ['Dine Out', 'Groceries', 'Utilities', 'Entertainment', 'Transport', 'Rent', 'Miscellaneous']
+START = date(2015, 1, 1)
+
+
+def connect(path, tuned):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if tuned:
+        apply_sqlite_pragmas(conn, sqlite_pragmas(vars(DatabaseConfig)))
+    return conn
+
+
+def populate(path, rows, accounts):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE txn (id INTEGER PRIMARY KEY, account_id INTEGER, date TEXT, '
+                 'category TEXT, amount REAL)')
+    conn.execute('CREATE INDEX ix_txn ON txn (account_id, date, category, amount)')
+    rng = random.Random(0)
+    conn.executemany('INSERT INTO txn (account_id, date, category, amount) VALUES (?, ?, ?, ?)', (
+        (rng.randrange(accounts), (START + timedelta(days=rng.randrange(3650))).isoformat(),
+         rng.choice(CATEGORIES), round(rng.uniform(-200, 200), 2))
+        for _ in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def run(path, tuned, seconds, readers, accounts):
+    stop = threading.Event()
+    latencies = []
+    stats = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def reader(seed):
+        conn = connect(path, tuned)
+        rng = random.Random(seed)
+        while not stop.is_set():
+            month = START + timedelta(days=rng.randrange(3650))
+            begin = time.perf_counter()
+            try:
+                conn.execute('SELECT category, SUM(amount) FROM txn WHERE account_id = ? AND date BETWEEN ? AND ? '
+                             'GROUP BY category',
+                             (rng.randrange(accounts), month.isoformat(), (month + timedelta(days=30)).isoformat())
+                             ).fetchall()
+            except sqlite3.OperationalError:
+                with lock:
+                    stats['errors'] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - begin)
+                stats['reads'] += 1
+        conn.close()
+
+    def writer():
+        conn = connect(path, tuned)
+        rng = random.Random(99)
+        while not stop.is_set():
+            try:
+                conn.executemany('INSERT INTO txn (account_id, date, category, amount) VALUES (?, ?, ?, ?)',
+                                 [(rng.randrange(accounts), date.today().isoformat(), rng.choice(CATEGORIES), -1.0)] * 50)
+                conn.commit()
+                with lock:
+                    stats['writes'] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    stats['errors'] += 1
+        conn.close()
+
+    if tuned:
+        connect(path, tuned).close()  # switch the file to WAL before the threads start
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'reads_per_sec': round(stats['reads'] / seconds, 1),
+        'write_commits_per_sec': round(stats['writes'] / seconds, 1),
+        'errors': stats['errors'],
+        'read_p50_ms': round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        'read_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, tuned in (('default', False), ('tuned', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            populate(path, args.rows, args.accounts)
+            results[mode] = run(path, tuned, args.seconds, args.readers, args.accounts)
+    print(json.dumps({'rows': args.rows, 'readers': args.readers, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Rule-based transaction categorization.
+
+A user's rules are compiled once into a RuleMatcher. Substring patterns go
+into one Aho-Corasick automaton and regex patterns sit behind one combined
+regex, so a description is scanned once instead of once per rule. Text
+matches are memoized per distinct description, because statements repeat
+the same merchants over and over. Amount and account conditions are then
+checked only against the few rules whose text matched; the first rule in
+priority order that passes every condition supplies the category.
+"""
+import re
+import threading
+from collections import deque, namedtuple
+
+SUBSTRING = 'substring'
+REGEX = 'regex'
+MATCH_TYPES = (SUBSTRING, REGEX)
+
+# min_amount/max_amount are signed cents (expenses are negative); None means unbounded.
+Rule = namedtuple('Rule', 'category match_type pattern min_amount max_amount account_id')
+
+
+def validate(rule):
+    """Raise ValueError when a rule cannot be compiled or could never match selectively."""
+    if not rule.category:
+        raise ValueError("category is required.")
+    if rule.match_type not in MATCH_TYPES:
+        raise ValueError(f"match_type must be one of: {', '.join(MATCH_TYPES)}.")
+    if rule.match_type == REGEX and rule.pattern:
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}.") from None
+    if not rule.pattern and rule.min_amount is None and rule.max_amount is None and rule.account_id is None:
+        raise ValueError("A rule needs a pattern, an amount range or an account.")
+    if rule.min_amount is not None and rule.max_amount is not None and rule.min_amount > rule.max_amount:
+        raise ValueError("min_amount is greater than max_amount.")
+
+
+class _Automaton:
+    """Aho-Corasick automaton reporting which of a set of keywords occur in a text."""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        outputs = [set()]
+        for index, keyword in keywords:
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    outputs.append(set())
+                state = nxt
+            outputs[state].add(index)
+        # Breadth-first, so a state's failure target is finished before the state itself.
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                outputs[nxt] |= outputs[self._fail[nxt]]
+        self._out = [frozenset(found) for found in outputs]
+
+    def find(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = set()
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class RuleMatcher:
+    def __init__(self, rules, memo_size=65536):
+        self.rules = tuple(rules)
+        self.memo_size = memo_size
+        keywords = []
+        self._always = set()  # rules without a pattern: only amount/account decide
+        self._regexes = []  # searched only when _any_regex matches
+        self._unfiltered_regexes = []  # always searched
+        for index, rule in enumerate(self.rules):
+            if not rule.pattern:
+                self._always.add(index)
+            elif rule.match_type == REGEX:
+                pattern = re.compile(rule.pattern, re.IGNORECASE)
+                # Joined into one regex, capture groups are renumbered and backreferences
+                # like (a)\1 would point at another rule's group; such patterns skip the filter.
+                (self._unfiltered_regexes if pattern.groups else self._regexes).append((index, pattern))
+            else:
+                keywords.append((index, rule.pattern.casefold()))
+        self._automaton = _Automaton(keywords) if keywords else None
+        # One search rejects descriptions no group-free regex rule can match; if the
+        # patterns cannot be combined (e.g. inline flags) they are all tried one by one.
+        try:
+            self._any_regex = re.compile('|'.join(f'(?:{pattern.pattern})' for _, pattern in self._regexes),
+                                         re.IGNORECASE) if self._regexes else None
+        except re.error:
+            self._any_regex = None
+        self._memo = {}
+
+    def _text_matches(self, description):
+        """Indexes, in priority order, of the rules whose pattern matches description."""
+        matches = self._memo.get(description)
+        if matches is None:
+            found = set(self._always)
+            if self._automaton is not None:
+                found |= self._automaton.find(description.casefold())
+            if self._regexes and (self._any_regex is None or self._any_regex.search(description)):
+                found.update(index for index, pattern in self._regexes if pattern.search(description))
+            found.update(index for index, pattern in self._unfiltered_regexes if pattern.search(description))
+            matches = tuple(sorted(found))
+            if len(self._memo) >= self.memo_size:
+                self._memo.clear()
+            self._memo[description] = matches
+        return matches
+
+    def categorize(self, description, amount, account_id):
+        """Category of the first rule matching the transaction, or None."""
+        for index in self._text_matches(description or ''):
+            rule = self.rules[index]
+            if rule.account_id is not None and rule.account_id != account_id:
+                continue
+            if rule.min_amount is not None and amount < rule.min_amount:
+                continue
+            if rule.max_amount is not None and amount > rule.max_amount:
+                continue
+            return rule.category
+        return None
+
+
+class MatcherCache:
+    """Compiled matchers per user, reused until that user's rules change."""
+
+    def __init__(self):
+        self._matchers = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, rules):
+        rules = tuple(rules)
+        with self._lock:
+            matcher = self._matchers.get(user_id)
+        if matcher is None or matcher.rules != rules:
+            matcher = RuleMatcher(rules)
+            with self._lock:
+                self._matchers[user_id] = matcher
+        return matcher
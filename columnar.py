@@ -0,0 +1,143 @@
+"""Parquet export and import of transactions.
+
+Files hold one row per transaction with typed columns: Date (date32),
+Account, Description and Category (strings, dictionary-encoded by Parquet)
+and Amount/Balance as decimal(18, 2), so cents round-trip exactly and no
+dates or numbers are re-parsed from text. pyarrow is optional; without it
+the functions below raise RuntimeError.
+"""
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+AVAILABLE = pa is not None
+
+MONEY = pa.decimal128(18, 2) if pa else None
+SCHEMA = pa.schema([
+    ('Date', pa.date32()),
+    ('Account', pa.string()),
+    ('Description', pa.string()),
+    ('Amount', MONEY),
+    ('Balance', MONEY),
+    ('Category', pa.string()),
+]) if pa else None
+IMPORT_COLUMNS = ['Date', 'Account', 'Description', 'Amount', 'Category']
+ROW_GROUP_SIZE = 65536
+COMPRESSION = 'zstd'
+
+
+def _require_pyarrow():
+    if not AVAILABLE:
+        raise RuntimeError("Parquet support requires the pyarrow package.")
+
+
+class _StreamSink:
+    """Write-only file object that hands back what Parquet wrote since the last drain().
+
+    tell() keeps counting across drains; the writer records row group offsets with it.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _money_from_cents(cents):
+    # int64 needs 19 digits; scaling by 0.01 keeps the unscaled value, so the cast is exact.
+    return pc.multiply(pa.array(cents, pa.int64()).cast(pa.decimal128(19, 0)),
+                       pa.scalar(Decimal('0.01'))).cast(MONEY)
+
+
+def write_parquet(rows, row_group_size=ROW_GROUP_SIZE):
+    """Encode (date, account, description, amount, balance, category) rows, money in cents.
+
+    A generator: yields the file piece by piece as each row group is written,
+    so a response can stream it without building the whole file in memory.
+    """
+    _require_pyarrow()
+    sink = _StreamSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), SCHEMA, compression=COMPRESSION) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= row_group_size:
+                writer.write_table(_table(batch))
+                batch = []
+                yield sink.drain()
+        if batch:
+            writer.write_table(_table(batch))
+    yield sink.drain()
+
+
+def _table(rows):
+    dates, accounts, descriptions, amounts, balances, categories = zip(*rows)
+    return pa.table([
+        pa.array(dates, pa.date32()),
+        pa.array(accounts, pa.string()),
+        pa.array(descriptions, pa.string()),
+        _money_from_cents(amounts),
+        _money_from_cents(balances),
+        pa.array(categories, pa.string()),
+    ], schema=SCHEMA)
+
+
+def _cents(column):
+    """Amount column as int64 cents. Decimals round half away from zero like to_cents(); integers
+    and floats are taken as units."""
+    if pa.types.is_decimal(column.type):
+        column = pc.round(column, ndigits=2, round_mode='half_towards_infinity')
+        return pc.multiply(column, pa.scalar(Decimal(100))).cast(pa.int64())
+    if pa.types.is_integer(column.type):
+        return pc.multiply(column.cast(pa.int64()), 100)
+    if pa.types.is_floating(column.type):
+        return pc.round(pc.multiply(column, 100.0), round_mode='half_towards_infinity').cast(pa.int64())
+    raise ValueError(f"Amount column has unsupported type {column.type}.")
+
+
+def _dates(column):
+    if pa.types.is_date(column.type) or pa.types.is_timestamp(column.type):
+        return column.cast(pa.date32())
+    raise ValueError(f"Date column has unsupported type {column.type}.")
+
+
+def read_parquet(path, batch_size):
+    """Yield (account, date, amount_cents, description, category) per row, batch_size rows at a time.
+
+    Extra columns (such as Balance) are not read. Nulls come through as None.
+    """
+    _require_pyarrow()
+    parquet = pq.ParquetFile(path)
+    missing = [name for name in IMPORT_COLUMNS if name not in parquet.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Parquet file is missing columns: {', '.join(missing)}.")
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=IMPORT_COLUMNS):
+        yield from zip(batch.column('Account').to_pylist(),
+                       _dates(batch.column('Date')).to_pylist(),
+                       _cents(batch.column('Amount')).to_pylist(),
+                       batch.column('Description').to_pylist(),
+                       batch.column('Category').to_pylist())
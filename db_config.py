@@ -0,0 +1,144 @@
+"""Database backend settings and dialect helpers.
+
+Settings are read in order from the defaults below, an optional config file
+named by the BUDGET_SETTINGS environment variable, DATABASE_URL, and
+BUDGET_* environment variables (e.g. BUDGET_SQLITE_SYNCHRONOUS=FULL,
+BUDGET_DB_POOL_SIZE=10). SQLite and PostgreSQL URIs are both supported.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import DateTime, Integer, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+class DatabaseConfig:
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///budget.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # WAL lets dashboard reads run while the scheduler or an import is writing.
+    SQLITE_JOURNAL_MODE = 'WAL'
+    # NORMAL is durable across application crashes in WAL mode; FULL also survives power loss.
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_CACHE_SIZE = -64000  # negative values are KiB, so 64 MB of page cache
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT = 5000  # ms to wait on a locked database before failing
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 3600
+
+
+def configure_database(app):
+    """Load database settings into app.config and register the SQLite pragma hook.
+
+    Must run before SQLAlchemy(app) so the engine is built with these options.
+    """
+    app.config.from_object(DatabaseConfig)
+    app.config.from_envvar('BUDGET_SETTINGS', silent=True)
+    if os.environ.get('DATABASE_URL'):
+        # Hosting platforms still hand out the postgres:// scheme SQLAlchemy no longer accepts.
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1)
+    app.config.from_prefixed_env('BUDGET')
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    # In-memory SQLite uses a single static connection, which takes no pool sizing.
+    if not (uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:')):
+        engine_options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+        engine_options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+        engine_options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+        engine_options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(Engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+
+def sqlite_pragmas(config):
+    """The PRAGMA name/value pairs to run on every new SQLite connection."""
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('cache_size', int(config['SQLITE_CACHE_SIZE'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT'])),
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+class date_bucket(FunctionElement):
+    """Integer bucket key for a date column: YYYYMM for unit='month', YYYY for unit='year'.
+
+    Compiles to strftime on SQLite and date_trunc on PostgreSQL, so the same
+    GROUP BY runs on either backend.
+    """
+    type = Integer()
+    inherit_cache = True
+    # The unit changes the SQL, so it has to be part of the statement cache key.
+    _traverse_internals = FunctionElement._traverse_internals + [('unit', InternalTraversal.dp_string)]
+
+    def __init__(self, column, unit='month'):
+        if unit not in ('month', 'year'):
+            raise ValueError(f"Unsupported bucket unit '{unit}'")
+        self.unit = unit
+        super().__init__(column)
+
+
+@compiles(date_bucket, 'sqlite')
+def _date_bucket_sqlite(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    fmt = '%Y%m' if element.unit == 'month' else '%Y'
+    return f"CAST(strftime('{fmt}', {column}) AS INTEGER)"
+
+
+def _pg_truncate(unit, column):
+    # date_trunc on a DATE resolves to the timestamptz overload, which is only STABLE
+    # and cannot be indexed; on a timestamp it is IMMUTABLE.
+    return f"date_trunc('{unit}', CAST({column} AS TIMESTAMP WITHOUT TIME ZONE))"
+
+
+@compiles(date_bucket, 'postgresql')
+def _date_bucket_postgresql(element, compiler, **kw):
+    truncated = _pg_truncate(element.unit, compiler.process(element.clauses, **kw))
+    if element.unit == 'month':
+        return f"CAST(EXTRACT(YEAR FROM {truncated}) * 100 + EXTRACT(MONTH FROM {truncated}) AS INTEGER)"
+    return f"CAST(EXTRACT(YEAR FROM {truncated}) AS INTEGER)"
+
+
+@compiles(date_bucket)
+def _date_bucket_default(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    if element.unit == 'month':
+        return f"CAST(EXTRACT(YEAR FROM {column}) * 100 + EXTRACT(MONTH FROM {column}) AS INTEGER)"
+    return f"CAST(EXTRACT(YEAR FROM {column}) AS INTEGER)"
+
+
+class month_start(FunctionElement):
+    """First instant of a date column's month, as PostgreSQL's ix_transaction_account_month indexes it.
+
+    Renders the same date_trunc expression date_bucket uses on PostgreSQL, so a
+    GROUP BY on it can be answered from that index.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(month_start)
+def _month_start(element, compiler, **kw):
+    return _pg_truncate('month', compiler.process(element.clauses, **kw))
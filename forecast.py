@@ -0,0 +1,97 @@
+"""Per-category monthly forecasts for /chart_data/prediction.
+
+Every model works on a (categories x months) matrix, oldest month first, and
+forecasts the month after the last column for all categories at once.
+"""
+import numpy as np
+
+MODELS = ('mean', 'ewma', 'trend', 'seasonal')
+SEASON_LENGTH = 12
+Z_95 = 1.96  # two-sided 95% band
+
+
+def build_matrix(month_keys, categories, totals, months):
+    """Pivot (month_key, category, total) columns into a categories x months matrix.
+
+    `months` is the ordered list of month keys that become the columns; rows
+    whose month is not in it are ignored. Integer totals (cents) are summed
+    exactly into an int64 matrix. Returns (category_names, matrix).
+    """
+    months = np.asarray(months)
+    names, row_index = np.unique(np.asarray(categories, dtype=object), return_inverse=True)
+    col_index = np.searchsorted(months, np.asarray(month_keys))
+    col_index = np.clip(col_index, 0, len(months) - 1)
+    in_window = months[col_index] == np.asarray(month_keys)
+    totals = np.asarray(totals)
+    dtype = np.int64 if totals.dtype.kind in 'iu' else float
+    matrix = np.zeros((len(names), len(months)), dtype=dtype)
+    np.add.at(matrix, (row_index[in_window], col_index[in_window]), totals.astype(dtype)[in_window])
+    return names.tolist(), matrix
+
+
+def forecast(history, model='mean', alpha=0.5):
+    """Forecast the next month for every row of `history`.
+
+    Returns (prediction, std, lower, upper), each a 1-D array with one entry
+    per category; lower/upper are the 95% band around the prediction.
+    Raises ValueError for an unknown model.
+    """
+    history = np.asarray(history, dtype=float)
+    if history.ndim != 2 or history.shape[1] == 0:
+        raise ValueError("history must be a non-empty categories x months matrix")
+    if model == 'mean':
+        prediction, std = _moving_average(history)
+    elif model == 'ewma':
+        prediction, std = _ewma(history, alpha)
+    elif model == 'trend':
+        prediction, std = _linear_trend(history)
+    elif model == 'seasonal':
+        prediction, std = _seasonal_naive(history)
+    else:
+        raise ValueError(f"Unknown forecast model '{model}'. Choose one of: {', '.join(MODELS)}.")
+    return prediction, std, prediction - Z_95 * std, prediction + Z_95 * std
+
+
+def _moving_average(history):
+    # Plain mean of the window with its population standard deviation.
+    return history.mean(axis=1), history.std(axis=1)
+
+
+def _ewma(history, alpha):
+    # Weights alpha * (1 - alpha)^age, newest month heaviest, normalised to 1.
+    n = history.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    weights /= weights.sum()
+    prediction = history @ weights
+    variance = ((history - prediction[:, None]) ** 2) @ weights
+    return prediction, np.sqrt(variance)
+
+
+def _linear_trend(history):
+    # Least-squares line per category, extrapolated one month ahead.
+    n = history.shape[1]
+    if n < 2:
+        return _moving_average(history)
+    x = np.arange(n, dtype=float)
+    x_centered = x - x.mean()
+    y_mean = history.mean(axis=1)
+    slope = ((history - y_mean[:, None]) @ x_centered) / (x_centered @ x_centered)
+    intercept = y_mean - slope * x.mean()
+    prediction = intercept + slope * n
+    residuals = history - (intercept[:, None] + slope[:, None] * x)
+    dof = max(n - 2, 1)
+    return prediction, np.sqrt((residuals ** 2).sum(axis=1) / dof)
+
+
+def _seasonal_naive(history):
+    # Same month last year; falls back to last month when there is less than a year of history.
+    n = history.shape[1]
+    if n < SEASON_LENGTH:
+        prediction = history[:, -1]
+        diffs = np.diff(history, axis=1)
+    else:
+        prediction = history[:, n - SEASON_LENGTH]
+        diffs = history[:, SEASON_LENGTH:] - history[:, :-SEASON_LENGTH]
+    if diffs.shape[1] == 0:
+        return prediction, np.zeros(len(history))
+    return prediction, np.sqrt((diffs ** 2).mean(axis=1))
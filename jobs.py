@@ -0,0 +1,74 @@
+"""In-process registry of background import jobs and their progress counters.
+
+The worker updates a job's counters while it runs and /jobs/<id> reads them.
+Like the response cache, the registry lives in one process, so a job's
+status is only visible from the worker process that accepted the upload.
+"""
+import threading
+import time
+import uuid
+
+
+class ImportJob:
+    def __init__(self, job_id, user_id, filename):
+        self.id = job_id
+        self.user_id = user_id
+        self.filename = filename
+        self.status = 'queued'  # queued -> running -> finished | failed
+        self.rows_parsed = 0
+        self.rows_inserted = 0
+        self.rows_skipped = 0  # unparseable rows and unknown accounts
+        self.rows_duplicate = 0  # already imported, by fingerprint
+        self.peak_rss_growth = None  # bytes the process's peak RSS rose during the import, if measured
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        self.status = 'running'
+        self.started_at = time.time()
+
+    def finish(self, error=None):
+        self.status = 'failed' if error else 'finished'
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "rows_inserted": self.rows_inserted,
+            "rows_skipped": self.rows_skipped,
+            "rows_duplicate": self.rows_duplicate,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "rows_per_second": round(self.rows_inserted / elapsed, 1) if elapsed else None,
+            "peak_rss_growth_mb": round(self.peak_rss_growth / 1e6, 1) if self.peak_rss_growth is not None else None,
+            "error": self.error,
+        }
+
+
+class JobRegistry:
+    def __init__(self, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id, filename):
+        """Register a queued job; the oldest finished jobs are forgotten past max_jobs."""
+        job = ImportJob(uuid.uuid4().hex, user_id, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.finished_at is not None]
+            for old in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[old.id]
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
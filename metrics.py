@@ -0,0 +1,151 @@
+"""Per-request latency and SQL instrumentation, exported in Prometheus text format.
+
+RequestMetrics hooks Flask's before/after_request and SQLAlchemy's cursor
+events. For every request it records wall time, SQL statement count, total
+SQL time and the slowest statement, then aggregates them per route.
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_STATEMENT_LABEL = 200
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = {}  # (method, status) -> count
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slowest_sql_seconds = 0.0
+        self.slowest_sql = ''
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self._routes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SERVER_TIMING', False)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        self.app = app
+
+    # --- Flask hooks ---
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.slowest_sql = (0.0, '')
+
+    def _finish_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        with self._lock:
+            stats = self._routes.setdefault(route, RouteStats())
+            key = (request.method, response.status_code)
+            stats.requests[key] = stats.requests.get(key, 0) + 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats.bucket_counts[i] += 1
+            stats.duration_sum += elapsed
+            stats.duration_count += 1
+            stats.sql_statements += g.sql_count
+            stats.sql_seconds += g.sql_seconds
+            if g.slowest_sql[0] > stats.slowest_sql_seconds:
+                stats.slowest_sql_seconds, stats.slowest_sql = g.slowest_sql
+        if self.app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries"'
+            )
+        return response
+
+    # --- SQLAlchemy hooks ---
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or 'metrics_start' not in g:
+            return
+        starts = conn.info.get('metrics_query_start')
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        g.sql_count += 1
+        g.sql_seconds += duration
+        if duration > g.slowest_sql[0]:
+            g.slowest_sql = (duration, statement)
+
+    # --- Export ---
+    def render(self, extra=None):
+        """Prometheus text exposition of all route stats.
+
+        extra maps further metric names to (type, help, value) tuples, e.g. the
+        response cache counters.
+        """
+        lines = [
+            '# HELP budget_requests_total Requests handled, by route, method and status.',
+            '# TYPE budget_requests_total counter',
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for route, stats in routes:
+                for (method, status), count in sorted(stats.requests.items()):
+                    lines.append(f'budget_requests_total{{route="{_escape(route)}",method="{method}",'
+                                 f'status="{status}"}} {count}')
+            lines += [
+                '# HELP budget_request_duration_seconds Wall time per request.',
+                '# TYPE budget_request_duration_seconds histogram',
+            ]
+            for route, stats in routes:
+                label = f'route="{_escape(route)}"'
+                for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    lines.append(f'budget_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'budget_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats.duration_count}')
+                lines.append(f'budget_request_duration_seconds_sum{{{label}}} {stats.duration_sum:.6f}')
+                lines.append(f'budget_request_duration_seconds_count{{{label}}} {stats.duration_count}')
+            lines += [
+                '# HELP budget_sql_statements_total SQL statements executed while serving requests.',
+                '# TYPE budget_sql_statements_total counter',
+            ]
+            lines += [f'budget_sql_statements_total{{route="{_escape(route)}"}} {stats.sql_statements}'
+                      for route, stats in routes]
+            lines += [
+                '# HELP budget_sql_duration_seconds_total Time spent in SQL while serving requests.',
+                '# TYPE budget_sql_duration_seconds_total counter',
+            ]
+            lines += [f'budget_sql_duration_seconds_total{{route="{_escape(route)}"}} {stats.sql_seconds:.6f}'
+                      for route, stats in routes]
+            lines += [
+                '# HELP budget_slowest_sql_seconds Slowest single SQL statement seen per route.',
+                '# TYPE budget_slowest_sql_seconds gauge',
+            ]
+            lines += [f'budget_slowest_sql_seconds{{route="{_escape(route)}",'
+                      f'statement="{_escape(_one_line(stats.slowest_sql))}"}} {stats.slowest_sql_seconds:.6f}'
+                      for route, stats in routes if stats.slowest_sql]
+        for name, (metric_type, help_text, value) in (extra or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _one_line(statement):
+    return ' '.join(statement.split())[:MAX_STATEMENT_LABEL]
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,54 @@
+"""SQL statement counting for catching N+1 queries in tests.
+
+    with QueryCounter(db.engine) as counter:
+        client.get('/dashboard_data')
+    assert counter.count <= 3
+
+assert_constant_queries() runs a request, grows the data set, runs it again
+and fails if the number of statements changed.
+"""
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Records every SQL statement executed on an engine while the block is active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+def assert_constant_queries(engine, request, grow, rounds=2):
+    """Fail if request() issues more statements after each call to grow().
+
+    request performs the route call (e.g. a test-client GET); grow adds rows or
+    accounts between runs. Raises AssertionError listing the statements of the
+    first and the offending run. Returns the constant statement count.
+    """
+    with QueryCounter(engine) as baseline:
+        request()
+    for _ in range(rounds):
+        grow()
+        with QueryCounter(engine) as counter:
+            request()
+        if counter.count > baseline.count:
+            raise AssertionError(
+                f"SQL statement count grew from {baseline.count} to {counter.count}:\n"
+                + "\n".join(counter.statements)
+            )
+    return baseline.count
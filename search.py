@@ -0,0 +1,100 @@
+"""Full-text search over transaction descriptions and categories.
+
+On SQLite the text lives in an external-content FTS5 table, transaction_fts,
+kept in sync with "transaction" by triggers. PostgreSQL matches a tsvector
+expression instead (see the GIN index on Transaction). parse_query() turns
+the search box string into terms that both backends' query syntaxes are
+built from, so user input never reaches MATCH/to_tsquery unescaped.
+
+    coffee shop       rows containing both words
+    "coffee shop"     the phrase
+    super*            words starting with "super"
+"""
+import re
+
+from sqlalchemy import func, literal_column, text
+
+FTS_TABLE = 'transaction_fts'
+
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'\w+')
+
+_SQLITE_DDL = [
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    # prefix='2 3' keeps extra indexes so short prefix queries need no term scan.
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, category,
+        content='transaction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON "transaction" BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, category ON "transaction" BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+    # Index whatever the table already holds.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+_TRIGGERS = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+
+# A literal, not a bind parameter: a REGCONFIG parameter cannot be rendered in index DDL.
+_PG_CONFIG = literal_column("'simple'::regconfig")
+
+
+def pg_document(description, category):
+    """tsvector searched on PostgreSQL; the GIN index and search queries must use this same expression."""
+    return func.to_tsvector(_PG_CONFIG, func.coalesce(description, '') + ' ' + category)
+
+
+def pg_match(document, terms):
+    return document.op('@@')(func.to_tsquery(_PG_CONFIG, tsquery(terms)))
+
+
+def create_sqlite_index(conn):
+    """(Re)create the FTS5 table and its triggers and index the existing rows."""
+    for statement in _SQLITE_DDL:
+        conn.execute(text(statement))
+
+
+def sqlite_index_is_current(conn):
+    """False when the FTS table or one of its triggers is missing, e.g. after a table rebuild."""
+    names = {name for (name,) in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE name = :table OR (type = 'trigger' AND tbl_name = 'transaction')"
+    ), {'table': FTS_TABLE})}
+    return FTS_TABLE in names and all(trigger in names for trigger in _TRIGGERS)
+
+
+def parse_query(query):
+    """Split a search string into (words, is_prefix) terms; quoted text stays one phrase.
+
+    Punctuation separates words, so an unquoted "AT&T" becomes the phrase
+    "at t". A trailing * makes the term's last word a prefix.
+    """
+    terms = []
+    for phrase, token in _TOKEN.findall(query or ''):
+        words = _WORD.findall(phrase or token)
+        if words:
+            terms.append((tuple(word.lower() for word in words), not phrase and token.endswith('*')))
+    return terms
+
+
+def fts5_query(terms):
+    """FTS5 MATCH expression: every term must match (implicit AND)."""
+    return ' '.join('"' + ' '.join(words) + '"' + ('*' if prefix else '') for words, prefix in terms)
+
+
+def tsquery(terms):
+    """PostgreSQL to_tsquery expression equivalent to fts5_query()."""
+    parts = []
+    for words, prefix in terms:
+        words = list(words)
+        if prefix:
+            words[-1] += ':*'
+        parts.append('(' + ' <-> '.join(words) + ')')
+    return ' & '.join(parts)
@@ -12,35 +12,42 @@ document.addEventListener("DOMContentLoaded", function() {
     const transactionFormContainer = document.getElementById("transactionFormContainer");
     const selectedAccountInput = document.getElementById("selectedAccountInput");
 
-    // Function to update dashboard data via AJAX.
-    function updateDashboard() {
-        // If "add_account" is selected, do not update dashboard.
-        if (accountSelect.value === "add_account") return;
-        
+    // Cursor for the next page of transactions (null when everything is loaded).
+    let nextCursor = null;
+    let loadingMore = false;
+
+    // Build the filter query string shared by /dashboard_data and /transactions_data.
+    function dashboardQuery() {
         let accountId = accountSelect.value;
-        let url = '/dashboard_data?';
+        let query = '';
         
         if (accountId) {
-            url += `account_id=${accountId}&`;
+            query += `account_id=${accountId}&`;
         }
         
         // Check for start_date and end_date filters.
         const startDateEl = document.getElementById("start_date");
         const endDateEl = document.getElementById("end_date");
         if (startDateEl && endDateEl && startDateEl.value && endDateEl.value) {
-            url += `start_date=${startDateEl.value}&end_date=${endDateEl.value}&`;
+            query += `start_date=${startDateEl.value}&end_date=${endDateEl.value}&`;
         }
         
         // Check for month filter.
         const monthEl = document.getElementById("month");
         if (monthEl && monthEl.value) {
-            url += `month=${monthEl.value}&`;
+            query += `month=${monthEl.value}&`;
         }
         
         // Remove trailing '&' if present.
-        url = url.endsWith('&') ? url.slice(0, -1) : url;
+        return query.endsWith('&') ? query.slice(0, -1) : query;
+    }
+
+    // Function to update dashboard data via AJAX.
+    function updateDashboard() {
+        // If "add_account" is selected, do not update dashboard.
+        if (accountSelect.value === "add_account") return;
         
-        fetch(url)
+        fetch('/dashboard_data?' + dashboardQuery())
             .then(response => response.json())
             .then(data => {
                 if (data.error) {
@@ -66,13 +73,70 @@ document.addEventListener("DOMContentLoaded", function() {
                 if (transactionsList) {
                     transactionsList.innerHTML = data.transactions_html;
                 }
+                nextCursor = data.next_cursor;
             })
             .catch(err => console.error("Error updating dashboard:", err));
     }
+
+    // Append the next page of transactions to the table.
+    function loadMoreTransactions() {
+        if (!nextCursor || loadingMore || accountSelect.value === "add_account") return;
+        loadingMore = true;
+        const url = '/transactions_data?' + dashboardQuery() + `&cursor=${encodeURIComponent(nextCursor)}`;
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    console.error("Transactions error:", data.error);
+                    return;
+                }
+                const transactionsList = document.getElementById("transactionsList");
+                if (transactionsList) {
+                    transactionsList.insertAdjacentHTML("beforeend", data.transactions_html);
+                }
+                nextCursor = data.next_cursor;
+            })
+            .catch(err => console.error("Error loading transactions:", err))
+            .finally(() => { loadingMore = false; });
+    }
+
+    // Fetch more rows when the user scrolls near the bottom of the page.
+    window.addEventListener("scroll", function() {
+        if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 300) {
+            loadMoreTransactions();
+        }
+    });
     
     
     // Initial dashboard update.
     updateDashboard();
+
+    // Poll a background import started from the import form until it finishes.
+    const importJobId = new URLSearchParams(window.location.search).get("import_job");
+    const importStatus = document.getElementById("importStatus");
+    function pollImportJob() {
+        fetch(`/jobs/${encodeURIComponent(importJobId)}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.error && !job.status) {
+                    importStatus.textContent = `Import: ${job.error}`;
+                    return;
+                }
+                importStatus.textContent = `Import ${job.status}: ${job.rows_inserted} rows inserted, `
+                    + `${job.rows_duplicate} duplicates, ${job.rows_skipped} skipped`
+                    + (job.error ? ` (${job.error})` : "");
+                if (job.status === "queued" || job.status === "running") {
+                    setTimeout(pollImportJob, 1000);
+                } else {
+                    updateDashboard();
+                }
+            })
+            .catch(err => console.error("Error polling import job:", err));
+    }
+    if (importJobId && importStatus) {
+        importStatus.style.display = "block";
+        pollImportJob();
+    }
     
     // Account selection change handler.
     if (accountSelect) {
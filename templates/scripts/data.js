@@ -49,7 +49,7 @@ document.addEventListener("DOMContentLoaded", function() {
         plugins: {
           title: {
             display: true,
-            text: 'Last 4 Months Actual and Next Month Prediction'
+            text: `Last ${data.labels.length - 1} Months Actual and Next Month Prediction`
           },
           tooltip: {
             mode: 'index',
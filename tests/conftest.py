@@ -0,0 +1,65 @@
+"""Shared fixtures.
+
+The app reads its database URI at import time, so a temporary SQLite
+database is configured before app is imported.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_database_dir = tempfile.TemporaryDirectory()
+os.environ['BUDGET_SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(_database_dir.name, 'test.db')
+
+import app as budget  # noqa: E402
+
+# Imports run on the scheduler's thread pool; only the daily recurring job is unwanted.
+budget.scheduler.remove_job('RecurringTransactionJob')
+
+
+@pytest.fixture
+def app_module():
+    """The app module with a fresh schema, inside an application context."""
+    budget.response_cache.clear()
+    with budget.app.app_context():
+        budget.db.create_all()
+        budget.ensure_schema()
+        yield budget
+        budget.db.session.remove()
+        budget.db.drop_all()
+
+
+@pytest.fixture
+def client(app_module):
+    """A test client logged in as 'test', who owns one debit account."""
+    user = app_module.User(username='test', password='test')
+    app_module.db.session.add(user)
+    app_module.db.session.flush()
+    app_module.db.session.add(app_module.Account(name='Checking', type='debit', initial_balance=0,
+                                                 current_balance=0, user_id=user.id))
+    app_module.db.session.commit()
+    client = app_module.app.test_client()
+    client.post('/login', data={'username': 'test', 'password': 'test'})
+    return client
+
+
+@pytest.fixture
+def add_transactions():
+    """Insert (date, description, cents, category) rows for an account and update the rollup."""
+    def add(account, rows):
+        sign = budget.balance_sign(account)
+        balance = account.current_balance
+        transactions = []
+        for day, description, amount, category in rows:
+            balance += sign * amount
+            transactions.append(budget.Transaction(date=day, description=description, amount=amount,
+                                                   balance=balance, category=category,
+                                                   account_id=account.id))
+        budget.db.session.add_all(transactions)
+        account.current_balance = balance
+        budget.apply_to_monthly_totals([(account.id, t.date, t.category, t.amount) for t in transactions])
+        budget.db.session.commit()
+    return add
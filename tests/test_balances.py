@@ -0,0 +1,121 @@
+"""Running balances stay chained after every kind of write."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+
+def ledger(app_module, account_id):
+    """(date, amount, balance) rows of an account in (date, id) order, and its current balance."""
+    app_module.db.session.expire_all()
+    Transaction = app_module.Transaction
+    rows = [(t.date, t.amount, t.balance) for t in
+            Transaction.query.filter_by(account_id=account_id).order_by(Transaction.date, Transaction.id)]
+    return rows, app_module.db.session.get(app_module.Account, account_id).current_balance
+
+
+def add(client, account_id, day, amount, description='Shop'):
+    response = client.post('/add_transaction', data={
+        'account_id': str(account_id), 'date': day.isoformat(), 'description': description,
+        'amount': amount, 'category': 'Groceries'})
+    assert response.status_code == 302
+
+
+@pytest.fixture
+def account_id(client, app_module):
+    return app_module.Account.query.filter_by(name='Checking').one().id
+
+
+def test_back_dated_add_shifts_later_balances(client, app_module, account_id):
+    add(client, account_id, date(2025, 1, 10), '-10')
+    add(client, account_id, date(2025, 1, 20), '-20')
+    add(client, account_id, date(2025, 1, 5), '-5')
+    assert ledger(app_module, account_id) == ([
+        (date(2025, 1, 5), -500, -500),
+        (date(2025, 1, 10), -1000, -1500),
+        (date(2025, 1, 20), -2000, -3500),
+    ], -3500)
+
+
+def test_remove_shifts_later_balances(client, app_module, account_id):
+    for day, amount in ((5, '-5'), (10, '-10'), (20, '-20')):
+        add(client, account_id, date(2025, 1, day), amount, description=f'Shop {day}')
+    removed = app_module.Transaction.query.filter_by(description='Shop 10').one().id
+    client.get(f'/remove_transaction/{removed}')
+    assert ledger(app_module, account_id) == ([
+        (date(2025, 1, 5), -500, -500),
+        (date(2025, 1, 20), -2000, -2500),
+    ], -2500)
+
+
+def test_bulk_remove_shifts_later_balances(client, app_module, account_id):
+    for day, amount in ((5, '-5'), (10, '-10'), (20, '-20')):
+        add(client, account_id, date(2025, 1, day), amount, description=f'Shop {day}')
+    removed = [str(t.id) for t in app_module.Transaction.query.filter(
+        app_module.Transaction.description.in_(['Shop 5', 'Shop 10']))]
+    client.post('/remove_transactions', data={'transaction_ids': removed})
+    assert ledger(app_module, account_id) == ([(date(2025, 1, 20), -2000, -2000)], -2000)
+
+
+def test_credit_balances_move_the_opposite_way(client, app_module):
+    client.post('/add_account', data={'name': 'Card', 'type': 'credit'})
+    card_id = app_module.Account.query.filter_by(name='Card').one().id
+    add(client, card_id, date(2025, 1, 10), '-10')
+    add(client, card_id, date(2025, 1, 5), '4')
+    assert ledger(app_module, card_id) == ([
+        (date(2025, 1, 5), 400, -400),
+        (date(2025, 1, 10), -1000, 600),
+    ], 600)
+
+
+def import_job(app_module, filename):
+    user_id = app_module.User.query.filter_by(username='test').one().id
+    return app_module.import_jobs.create(user_id, filename)
+
+
+def test_import_chains_and_rebalances_back_dated_rows(client, app_module, account_id):
+    add(client, account_id, date(2026, 1, 1), '-100', description='Rent')
+    job = import_job(app_module, 'statement.csv')
+    app_module.import_records(job, [
+        ('Checking', date(2026, 2, 1), -1000, 'Later', 'Groceries'),
+        ('Checking', date(2025, 1, 1), 5000, 'Earlier', 'Income'),
+        ('Nowhere', date(2025, 1, 1), 100, 'Unknown account', 'Income'),
+    ])
+    assert (job.rows_inserted, job.rows_skipped) == (2, 1)
+    assert ledger(app_module, account_id) == ([
+        (date(2025, 1, 1), 5000, 5000),
+        (date(2026, 1, 1), -10000, -5000),
+        (date(2026, 2, 1), -1000, -6000),
+    ], -6000)
+
+
+def write_workbook(tmp_path, rows):
+    path = tmp_path / 'statement.xlsx'
+    pd.DataFrame(rows, columns=['Date', 'Bank', 'Where/When', 'Money Earn/Spent', 'Balance', 'Category']
+                 ).to_excel(path, index=False)
+    return str(path)
+
+
+def test_excel_import_rebalances_back_dated_rows(client, app_module, account_id, tmp_path):
+    add(client, account_id, date(2026, 1, 1), '-100', description='Rent')
+    path = write_workbook(tmp_path, [
+        ['01-05-2025', 'Checking', 'Shop', -20.125, -20.13, 'Groceries'],
+        ['01-06-2025', 'Checking', 'Salary', 1000, 979.87, 'Income'],
+    ])
+    job = import_job(app_module, 'statement.xlsx')
+    app_module.import_excel_file(job, path)
+    if app_module.resource is not None:
+        assert job.to_dict()['peak_rss_growth_mb'] >= 0
+    assert ledger(app_module, account_id) == ([
+        (date(2025, 1, 5), -2013, -2013),
+        (date(2025, 1, 6), 100000, 97987),
+        (date(2026, 1, 1), -10000, 87987),
+    ], 87987)
+
+
+def test_excel_opening_balance_rebalances_existing_rows(client, app_module, account_id, tmp_path):
+    add(client, account_id, date(2026, 1, 1), '-100', description='Rent')
+    path = write_workbook(tmp_path, [['01-01-2025', 'Checking', 'Balance', 0, 500, 'Opening']])
+    app_module.import_excel_file(import_job(app_module, 'statement.xlsx'), path)
+    assert app_module.db.session.get(app_module.Account, account_id).initial_balance == 50000
+    assert ledger(app_module, account_id) == ([(date(2026, 1, 1), -10000, 40000)], 40000)
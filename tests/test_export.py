@@ -0,0 +1,39 @@
+import gc
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def no_gc():
+    """Leaked connections must not be rescued by the cyclic garbage collector."""
+    gc.disable()
+    yield
+    gc.enable()
+
+
+@pytest.mark.parametrize('url', ['/export', '/export?format=parquet'])
+def test_export_returns_its_connection(app_module, client, add_transactions, no_gc, url):
+    if 'parquet' in url and not app_module.columnar.AVAILABLE:
+        pytest.skip('pyarrow is not installed')
+    account = app_module.Account.query.first()
+    add_transactions(account, [(date(2025, 1, day), 'Supermarket', -100 * day, 'Groceries') for day in range(1, 11)])
+    for _ in range(20):
+        response = client.get(url)
+        assert response.status_code == 200
+        response.get_data()
+        response.close()
+        assert app_module.db.engine.pool.checkedout() == 0
+
+
+def test_export_csv_contents(app_module, client, add_transactions):
+    account = app_module.Account.query.first()
+    add_transactions(account, [(date(2025, 1, 2), 'Supermarket', -1234, 'Groceries'),
+                               (date(2025, 1, 3), 'Salary', 50000, 'Income')])
+    response = client.get('/export')
+    assert response.get_data(as_text=True).splitlines() == [
+        'Date,Account,Description,Amount,Balance,Category',
+        '01-02-2025,Checking,Supermarket,-12.34,-12.34,Groceries',
+        '01-03-2025,Checking,Salary,500.00,487.66,Income',
+    ]
+    response.close()
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import app as budget
+
+
+@pytest.mark.parametrize('units', [20.125, -20.125, 1.005, -1.005, 0.5, 12.34, -0.004, 0.0, 99999.995])
+def test_series_to_cents_matches_to_cents(units):
+    assert budget.series_to_cents(pd.Series([units])).tolist() == [budget.to_cents(units)]
+
+
+LEGACY_SCHEMA = [
+    'DROP TABLE monthly_category_total',
+    'DROP TABLE "transaction"',
+    'DROP TABLE account',
+    'CREATE TABLE account (id INTEGER PRIMARY KEY, name VARCHAR(80) NOT NULL, type VARCHAR(20) NOT NULL, '
+    'initial_balance FLOAT, user_id INTEGER NOT NULL REFERENCES user(id))',
+    'CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, date DATE NOT NULL, description VARCHAR(120), '
+    'amount FLOAT NOT NULL, balance FLOAT NOT NULL, category VARCHAR(80) NOT NULL, '
+    'account_id INTEGER NOT NULL REFERENCES account(id), is_recurring BOOLEAN, recurring_date DATE, '
+    'frequency VARCHAR(20))',
+    "INSERT INTO user (id, username, password) VALUES (1, 'legacy', 'legacy')",
+    "INSERT INTO account VALUES (1, 'Checking', 'debit', 20.125, 1)",
+    """INSERT INTO "transaction" VALUES
+        (1, '2025-01-01', 'a', -1.005, 19.12, 'X', 1, 0, NULL, NULL),
+        (2, '2025-01-02', 'b', 1.005, 20.125, 'X', 1, 0, NULL, NULL)""",
+]
+
+
+def test_migration_rounds_like_to_cents(app_module):
+    with app_module.db.engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    app_module.db.create_all()
+    app_module.ensure_schema()
+
+    rows = app_module.db.session.execute(text('SELECT amount, balance FROM "transaction" ORDER BY id')).all()
+    # Balances are recomputed from the rounded amounts, so the chain stays exact.
+    assert [tuple(row) for row in rows] == [(budget.to_cents(-1.005), 1912), (budget.to_cents(1.005), 2013)]
+    assert budget.to_cents(-1.005) == -101
+    account = app_module.db.session.get(app_module.Account, 1)
+    assert (account.initial_balance, account.current_balance) == (budget.to_cents(20.125), 2013)
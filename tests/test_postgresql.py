@@ -0,0 +1,105 @@
+"""PostgreSQL schema and the monthly rollup.
+
+The DDL and query tests compile against the PostgreSQL dialect and always
+run. The rest need a server and run when BUDGET_TEST_POSTGRESQL_URL is set,
+e.g. postgresql://budget@localhost/budget_test; its tables are dropped.
+"""
+import os
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_mock_engine, inspect, select
+from sqlalchemy.dialects import postgresql
+
+import app as budget
+
+POSTGRESQL_URL = os.environ.get('BUDGET_TEST_POSTGRESQL_URL')
+
+# Straddles a month boundary and a year boundary.
+ROWS = [
+    (date(2024, 12, 31), 'Rent', -90000, 'Rent'),
+    (date(2025, 1, 1), 'Supermarket', -2500, 'Groceries'),
+    (date(2025, 1, 31), 'Supermarket', -1500, 'Groceries'),
+    (date(2025, 2, 1), 'Coffee shop', -450, 'Dine Out'),
+]
+EXPECTED_TOTALS = {
+    (202412, 'Rent'): (-90000, 1),
+    (202501, 'Groceries'): (-4000, 2),
+    (202502, 'Dine Out'): (-450, 1),
+}
+MONTH_EXPRESSION = "date_trunc('month', CAST(date AS TIMESTAMP WITHOUT TIME ZONE))"
+
+
+def postgresql_ddl():
+    statements = []
+    engine = create_mock_engine('postgresql+psycopg2://',
+                                lambda sql, *a, **kw: statements.append(str(sql.compile(dialect=engine.dialect))))
+    budget.db.metadata.create_all(engine, checkfirst=False)
+    return statements
+
+
+def test_month_index_uses_immutable_expression():
+    (index,) = [sql for sql in postgresql_ddl() if 'ix_transaction_account_month' in sql]
+    assert f'(account_id, {MONTH_EXPRESSION})' in index
+
+
+def test_monthly_rollup_groups_by_indexed_expression():
+    sql = str(budget.monthly_totals_query('postgresql').compile(dialect=postgresql.dialect()))
+    group_by = sql[sql.index('GROUP BY'):]
+    assert MONTH_EXPRESSION.replace('(date ', '(transaction.date ') in group_by
+
+
+def rebuilt_totals(account):
+    budget.rebuild_monthly_totals()
+    budget.db.session.commit()
+    rows = budget.db.session.execute(
+        select(budget.MonthlyCategoryTotal.year_month, budget.MonthlyCategoryTotal.category,
+               budget.MonthlyCategoryTotal.total, budget.MonthlyCategoryTotal.count)
+        .where(budget.MonthlyCategoryTotal.account_id == account.id))
+    return {(year_month, category): (total, count) for year_month, category, total, count in rows}
+
+
+def create_account():
+    user = budget.User(username='test', password='test')
+    budget.db.session.add(user)
+    budget.db.session.flush()
+    account = budget.Account(name='Checking', type='debit', initial_balance=0, current_balance=0,
+                             user_id=user.id)
+    budget.db.session.add(account)
+    budget.db.session.commit()
+    return account
+
+
+def test_rebuild_monthly_totals_sqlite(app_module, add_transactions):
+    account = create_account()
+    add_transactions(account, ROWS)
+    assert rebuilt_totals(account) == EXPECTED_TOTALS
+
+
+@pytest.fixture
+def postgresql_db():
+    if not POSTGRESQL_URL:
+        pytest.skip('BUDGET_TEST_POSTGRESQL_URL is not set')
+    server = Flask(__name__)
+    server.config['SQLALCHEMY_DATABASE_URI'] = POSTGRESQL_URL
+    budget.db.init_app(server)
+    with server.app_context():
+        budget.db.drop_all()
+        budget.db.create_all()
+        budget.ensure_schema()
+        yield budget.db
+        budget.db.session.remove()
+        budget.db.drop_all()
+        budget.db.engine.dispose()
+
+
+def test_postgresql_indexes_are_created(postgresql_db):
+    names = {index['name'] for index in inspect(postgresql_db.engine).get_indexes('transaction')}
+    assert {'ix_transaction_account_month', 'ix_transaction_search'} <= names
+
+
+def test_rebuild_monthly_totals_postgresql(postgresql_db, add_transactions):
+    account = create_account()
+    add_transactions(account, ROWS)
+    assert rebuilt_totals(account) == EXPECTED_TOTALS
@@ -0,0 +1,57 @@
+"""Per-route SQL statement counts must not grow with the number of accounts or transactions."""
+from datetime import date, timedelta
+
+import pytest
+
+from querycount import assert_constant_queries
+
+MONTH_YEAR = date.today().strftime('%m-%Y')
+
+ROUTES = [
+    '/dashboard',
+    '/dashboard?filter_account_id=1',
+    '/dashboard_data',
+    f'/chart_data/{MONTH_YEAR}',
+    f'/chart_data/prediction?month_year={MONTH_YEAR}',
+    '/export',
+    '/export?format=parquet',
+    f'/data/{MONTH_YEAR}',
+    '/data',
+]
+
+
+@pytest.fixture
+def grow(app_module, add_transactions):
+    """Each call adds an account and a few months of transactions to every account."""
+    user_id = app_module.User.query.filter_by(username='test').one().id
+    rounds = iter(range(1, 100))
+
+    def grow():
+        n = next(rounds)
+        app_module.db.session.add(app_module.Account(name=f'Account {n}', type='credit' if n % 2 else 'debit',
+                                                     initial_balance=0, current_balance=0, user_id=user_id))
+        app_module.db.session.commit()
+        today = date.today()
+        for account in app_module.Account.query.filter_by(user_id=user_id).all():
+            add_transactions(account, [
+                (today - timedelta(days=30 * month + n), f'Payee {n}', -1000 * n, category)
+                for month in range(4)
+                for category in ('Groceries', 'Dine Out')
+            ])
+    return grow
+
+
+@pytest.mark.parametrize('url', ROUTES)
+def test_route_queries_are_constant(app_module, client, grow, url):
+    if 'parquet' in url and not app_module.columnar.AVAILABLE:
+        pytest.skip('pyarrow is not installed')
+
+    def request():
+        # A cached body would skip the queries under test.
+        app_module.response_cache.clear()
+        response = client.get(url)
+        response.get_data()  # streamed bodies run their queries while being read
+        assert response.status_code < 400, response.status_code
+
+    grow()
+    assert_constant_queries(app_module.db.engine, request, grow)
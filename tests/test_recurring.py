@@ -0,0 +1,63 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
+from querycount import assert_constant_queries
+
+
+def add_template(app_module, account, day, recurring_date, description='Rent', frequency='monthly'):
+    app_module.db.session.add(app_module.Transaction(
+        date=day, description=description, amount=-1000, balance=0, category='Rent',
+        account_id=account.id, is_recurring=True, recurring_date=recurring_date, frequency=frequency))
+    app_module.db.session.commit()
+
+
+def posted_dates(app_module, description):
+    return [t.date for t in app_module.Transaction.query
+            .filter_by(description=description + ' (Recurring)')
+            .order_by(app_module.Transaction.date)]
+
+
+def test_catches_up_every_missed_period(app_module, client):
+    account = app_module.Account.query.first()
+    first = date.today() - relativedelta(months=3)
+    add_template(app_module, account, first, first + relativedelta(months=1))
+
+    result = app_module.check_recurring_transactions()
+
+    assert result['posted'] == 3
+    assert posted_dates(app_module, 'Rent') == [first + relativedelta(months=n) for n in (1, 2, 3)]
+    assert app_module.check_recurring_transactions()['posted'] == 0
+
+
+def test_job_queries_do_not_grow_with_templates(app_module, client):
+    account_id = app_module.Account.query.first().id
+    today = date.today()
+    names = (f'Bill {n}' for n in range(100))
+
+    def add_due_templates():
+        account = app_module.db.session.get(app_module.Account, account_id)
+        for _ in range(3):
+            add_template(app_module, account, today - relativedelta(months=1), today, description=next(names))
+
+    add_due_templates()
+    assert_constant_queries(app_module.db.engine, app_module.check_recurring_transactions, add_due_templates)
+
+
+def test_legacy_schedules_are_migrated(app_module, client):
+    account = app_module.Account.query.first()
+    start = date.today() - relativedelta(months=2)
+    # Old layout: an unposted template still holds its own date; a posted one holds its
+    # next date, and its posted copy carries a schedule as well.
+    add_template(app_module, account, start, start, description='Gym')
+    add_template(app_module, account, start, start + relativedelta(months=1), description='Rent')
+    add_template(app_module, account, start + relativedelta(days=3), start + relativedelta(months=1),
+                 description='Rent (Recurring)')
+
+    app_module.migrate_recurring_schedules()
+    app_module.migrate_recurring_schedules()  # idempotent
+    app_module.check_recurring_transactions()
+
+    expected = [start + relativedelta(months=n) for n in (1, 2)]
+    assert posted_dates(app_module, 'Gym') == expected
+    assert posted_dates(app_module, 'Rent') == [start + relativedelta(days=3)] + expected